@@ -0,0 +1,208 @@
+"""Admission control for the voice pipeline.
+
+Every voice note costs one Whisper call and one LLM call against shared Groq
+rate limits. VoiceQueue sits in front of that work:
+
+- clips longer than VOICE_MAX_SECONDS are refused outright
+- each user has a token bucket, so one rep (or a client stuck resending)
+  is told to slow down instead of draining the shared budget
+- admitted notes wait in a per-user round-robin queue, so a user with five
+  queued notes can't starve a user with one
+- workers only process a note when the global Whisper and LLM buckets, sized
+  to the provider's requests-per-minute limits, have a token for it
+
+A note's processing is traced as a voice.process span under the update that
+submitted it, so one trace covers the note from arrival to reply.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from metrics import VOICE_ADMISSIONS, VOICE_QUEUE_DEPTH, VOICE_QUEUE_WAIT_SECONDS
+from tracing import capture, resume
+
+logger = logging.getLogger(__name__)
+
+
+# Replies for notes that were admitted but never got a result
+FAILED_MESSAGE = "Sorry, something went wrong with that voice note. Please try again, or use a text command."
+DROPPED_MESSAGE = "Sorry, I couldn't process that voice note because I was restarting. Please resend it."
+
+
+class AdmissionRejected(Exception):
+    """The voice note was not queued; str(e) is the reply for the user."""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep(self.wait_time())
+
+
+class FairQueue:
+    """Per-key FIFO queues served round-robin across keys."""
+
+    def __init__(self):
+        self._queues = OrderedDict()
+        self._count = 0
+        self._available = asyncio.Semaphore(0)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def pending(self, key) -> int:
+        return len(self._queues.get(key, ()))
+
+    def put(self, key, item):
+        self._queues.setdefault(key, deque()).append(item)
+        self._count += 1
+        self._available.release()
+
+    async def get(self):
+        await self._available.acquire()
+        key, queue = next(iter(self._queues.items()))
+        item = queue.popleft()
+        if queue:
+            self._queues.move_to_end(key)  # back of the rotation
+        else:
+            del self._queues[key]
+        self._count -= 1
+        return item
+
+    def drain(self) -> list:
+        """Remove and return every queued item."""
+        items = [item for queue in self._queues.values() for item in queue]
+        self._queues.clear()
+        self._count = 0
+        self._available = asyncio.Semaphore(0)
+        return items
+
+
+class VoiceQueue:
+    def __init__(self, max_seconds: int, user_per_minute: float, user_burst: int,
+                 max_queued_per_user: int, max_queue: int, whisper_rpm: float, llm_rpm: float, workers: int):
+        self.max_seconds = max_seconds
+        self.user_per_minute = user_per_minute
+        self.user_burst = user_burst
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queue = max_queue
+        self.workers = workers
+        self.whisper_budget = TokenBucket(whisper_rpm / 60, max(1, whisper_rpm / 60))
+        self.llm_budget = TokenBucket(llm_rpm / 60, max(1, llm_rpm / 60))
+        self._user_buckets = {}
+        self._queue = FairQueue()
+        self._idle = 0
+        self._tasks = []
+
+    def submit(self, user_id: int, duration: int | None, job, notify) -> int:
+        """Queue job (an async callable) for user_id. Returns how many notes are ahead of it.
+
+        notify(text) tells the user if the job fails or is dropped at shutdown.
+        Raises AdmissionRejected with a user-facing message if the note is refused.
+        """
+        if duration and duration > self.max_seconds:
+            self._reject("too_long", f"That voice note is {duration}s. Please keep notes under {self.max_seconds}s.")
+        if self._queue.pending(user_id) >= self.max_queued_per_user:
+            self._reject("user_queue_full", "You already have voice notes waiting. I'll get to those first!")
+        if len(self._queue) >= self.max_queue:
+            self._reject("queue_full", "I'm swamped right now. Please try again in a minute, or use a text command.")
+
+        bucket = self._user_buckets.get(user_id)
+        if bucket is None:
+            bucket = self._user_buckets[user_id] = TokenBucket(self.user_per_minute / 60, self.user_burst)
+        if not bucket.try_acquire():
+            self._reject("rate_limited", f"You're sending voice notes too fast. Try again in {int(bucket.wait_time()) + 1}s.")
+
+        ahead = max(0, len(self._queue) - self._idle)
+        # The job runs on a worker, but its spans belong to the submitting update's trace
+        self._queue.put(user_id, (time.monotonic(), user_id, job, notify, capture()))
+        VOICE_ADMISSIONS.inc(outcome="accepted")
+        VOICE_QUEUE_DEPTH.set(len(self._queue))
+        return ahead
+
+    def budget_wait(self) -> float:
+        """Seconds until the global Groq budget allows another note."""
+        return max(self.whisper_budget.wait_time(), self.llm_budget.wait_time())
+
+    def _reject(self, outcome: str, message: str):
+        VOICE_ADMISSIONS.inc(outcome=outcome)
+        raise AdmissionRejected(message)
+
+    def start(self):
+        """Spawn the worker tasks on the running event loop."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker(), name=f"voice-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 0):
+        """Stop the workers, first giving queued and running notes up to timeout seconds to finish.
+
+        Users whose notes are still queued or running after that are asked to resend.
+        """
+        if timeout:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        dropped = self._queue.drain()
+        for _, _, _, notify, _ in dropped:
+            notify(DROPPED_MESSAGE)
+        if dropped:
+            logger.warning("Dropped queued voice notes at shutdown", extra={"dropped": len(dropped)})
+        VOICE_QUEUE_DEPTH.set(0)
+
+    async def join(self):
+        """Wait until every queued note has been picked up and finished."""
+        while len(self._queue) or self._idle < len(self._tasks):
+            await asyncio.sleep(0.01)
+
+    async def _worker(self):
+        while True:
+            self._idle += 1
+            try:
+                enqueued_at, user_id, job, notify, parent = await self._queue.get()
+            finally:
+                self._idle -= 1
+            VOICE_QUEUE_DEPTH.set(len(self._queue))
+            try:
+                await self.whisper_budget.acquire()
+                await self.llm_budget.acquire()
+                waited = time.monotonic() - enqueued_at
+                VOICE_QUEUE_WAIT_SECONDS.observe(waited)
+                with resume(parent, "voice.process", **{"voice.user_id": user_id, "voice.queue_seconds": round(waited, 3)}):
+                    await job()
+            except asyncio.CancelledError:
+                notify(DROPPED_MESSAGE)
+                raise
+            except Exception:
+                notify(FAILED_MESSAGE)
+                logger.exception("Voice job failed", extra={"user_id": user_id})
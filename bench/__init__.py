@@ -0,0 +1 @@
+"""Offline benchmark harness: replays synthetic updates against the real handlers using local fakes."""
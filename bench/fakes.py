@@ -0,0 +1,435 @@
+"""In-process stand-ins for Supabase, Groq, httpx and the Telegram Bot API.
+
+Each fake implements only the surface the bot actually touches and sleeps for
+a configurable latency per call, so handler timings include realistic I/O
+waits without any network. Sync clients (Supabase, Groq) block with
+time.sleep just like the real ones; Telegram calls use asyncio.sleep.
+"""
+import asyncio
+import itertools
+import json
+import re
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from voice import parse_lead_from_text, parse_update_from_text, parse_done_from_text
+
+
+@dataclass
+class Latency:
+    """Injected per-call latency in seconds."""
+    db: float = 0.001
+    telegram: float = 0.002
+    download: float = 0.005
+    whisper: float = 0.05
+    llm: float = 0.03
+
+
+def _sleep(seconds: float):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+# Supabase
+
+class FakeTable:
+    """Rows for one table, indexed by id and user_id so lookups stay O(rows per user)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = {}
+        self.by_user = {}
+        self._ids = itertools.count(1)
+
+    def insert(self, row: dict) -> dict:
+        row = dict(row)
+        row.setdefault("id", next(self._ids))
+        now = datetime.now().isoformat()
+        row.setdefault("created_at", now)
+        if self.name == "leads":
+            row.setdefault("updated_at", now)
+            row.setdefault("follow_up_date", None)
+        elif self.name == "users":
+            row.setdefault("ooo_until", None)
+        self.rows[row["id"]] = row
+        if "user_id" in row:
+            self.by_user.setdefault(row["user_id"], {})[row["id"]] = row
+        return row
+
+    def delete(self, row: dict):
+        del self.rows[row["id"]]
+        if "user_id" in row:
+            self.by_user.get(row["user_id"], {}).pop(row["id"], None)
+
+    def candidates(self, filters: list) -> list:
+        for op, column, value in filters:
+            if op == "eq" and column == "id":
+                row = self.rows.get(int(value))
+                return [row] if row else []
+            if op == "eq" and column == "user_id":
+                return list(self.by_user.get(value, {}).values())
+        return list(self.rows.values())
+
+
+def _compare(op: str, actual, expected) -> bool:
+    if op == "is":
+        return actual is None if expected == "null" else actual == expected
+    if actual is None:
+        return False
+    if isinstance(actual, (date, datetime)):
+        actual = actual.isoformat()
+    if op == "eq":
+        return actual == expected
+    if op == "neq":
+        return actual != expected
+    if op == "lt":
+        return actual < expected
+    if op == "lte":
+        return actual <= expected
+    if op == "gt":
+        return actual > expected
+    if op == "gte":
+        return actual >= expected
+    if op == "in":
+        return actual in expected
+    raise ValueError(f"Unsupported filter: {op}")
+
+
+class FakeQuery:
+    """Chainable query builder mirroring the postgrest-py calls used in database.py."""
+
+    def __init__(self, db: "FakeSupabase", table: FakeTable):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.filters = []
+        self.or_groups = []
+        self._order = None
+        self._range = None
+        self._limit = None
+
+    def select(self, *columns, count=None):
+        self.operation = "select"
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def update(self, payload):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    def _filter(self, op, column, value):
+        self.filters.append((op, column, value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def or_(self, expression: str):
+        group = []
+        for clause in expression.split(","):
+            column, op, value = clause.split(".", 2)
+            group.append((op, column, value))
+        self.or_groups.append(group)
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def range(self, start, end):
+        self._range = (start, end)
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def _matches(self, row) -> bool:
+        if not all(_compare(op, row.get(column), value) for op, column, value in self.filters):
+            return False
+        return all(
+            any(_compare(op, row.get(column), value) for op, column, value in group)
+            for group in self.or_groups
+        )
+
+    def execute(self):
+        _sleep(self.db.latency.db)
+        self.db.calls += 1
+        if self.operation == "insert":
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            return SimpleNamespace(data=[dict(self.table.insert(row)) for row in payload], count=None)
+
+        rows = [row for row in self.table.candidates(self.filters) if self._matches(row)]
+        if self.operation == "update":
+            for row in rows:
+                row.update(self.payload)
+        elif self.operation == "delete":
+            for row in rows:
+                self.table.delete(row)
+        if self._order:
+            column, desc = self._order
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column) or 0), reverse=desc)
+        if self._range:
+            rows = rows[self._range[0]:self._range[1] + 1]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return SimpleNamespace(data=[dict(row) for row in rows], count=len(rows))
+
+
+class FakeSupabase:
+    """Stands in for supabase.Client; tables are created on first use."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.tables = {}
+        self.calls = 0
+
+    def table(self, name: str) -> FakeQuery:
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name)
+        return FakeQuery(self, self.tables[name])
+
+    def rpc(self, name: str, params: dict) -> "FakeRpc":
+        return FakeRpc(self, getattr(self, f"_rpc_{name}"), params)
+
+    # Python versions of the SQL functions in schema.sql
+
+    def _lead_rows(self, user_id=None):
+        """Live then archived leads, optionally for one user."""
+        for name in ("leads", "leads_archive"):
+            table = self.table(name).table
+            yield from (table.by_user.get(user_id, {}) if user_id is not None else table.rows).values()
+
+    def _rpc_pipeline_stats(self, p_user_id=None, p_today=None):
+        stats = {}
+        for lead in self._lead_rows(p_user_id):
+            row = stats.setdefault(lead["user_id"], {
+                "user_id": lead["user_id"], "active": 0, "won": 0, "lost": 0, "overdue": 0, "_days": [],
+            })
+            row[lead["status"]] += 1
+            if lead["status"] == "active" and lead.get("follow_up_date") and lead["follow_up_date"] < p_today:
+                row["overdue"] += 1
+            if lead["status"] != "active":
+                closed = datetime.fromisoformat(lead.get("closed_at") or lead["updated_at"])
+                row["_days"].append((closed - datetime.fromisoformat(lead["created_at"])).total_seconds() / 86400)
+        for row in stats.values():
+            days = row.pop("_days")
+            row["avg_days_to_close"] = round(sum(days) / len(days), 1) if days else None
+        return list(stats.values())
+
+    def _rpc_search_leads(self, p_user_id, p_query, p_limit=5, p_offset=0):
+        terms = [t for t in re.findall(r"\w+", p_query.lower()) if len(t) > 2]
+        matches = []
+        for lead in self._lead_rows(p_user_id):
+            text = f"{lead['name']} {lead['company']} {lead['next_steps']}".lower()
+            rank = sum(term in text for term in terms)
+            if terms and rank == len(terms):
+                matches.append({**lead, "rank": float(rank)})
+        matches.sort(key=lambda lead: (lead["rank"], lead["id"]), reverse=True)
+        return matches[p_offset:p_offset + p_limit]
+
+    def _rpc_archive_closed_leads(self, p_batch_size=500, p_min_age_days=7):
+        leads, archive = self.table("leads").table, self.table("leads_archive").table
+        cutoff = (datetime.now() - timedelta(days=p_min_age_days)).isoformat()
+        closed = sorted(
+            (lead for lead in leads.rows.values()
+             if lead["status"] != "active" and (lead.get("closed_at") or lead["updated_at"]) < cutoff),
+            key=lambda lead: lead["id"],
+        )[:p_batch_size]
+        for lead in closed:
+            leads.delete(lead)
+            archive.insert({**lead, "archived_at": datetime.now().isoformat()})
+        return len(closed)
+
+
+class FakeRpc:
+    def __init__(self, db: FakeSupabase, fn, params: dict):
+        self.db = db
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        _sleep(self.db.latency.db)
+        self.db.calls += 1
+        return SimpleNamespace(data=self.fn(**self.params), count=None)
+
+
+# Groq
+
+class FakeGroq:
+    """Whisper returns the utterance encoded in the uploaded file; the LLM answers via voice.py's local parsers."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._complete))
+
+    def _transcribe(self, file, model, language=None, **kwargs):
+        _sleep(self.latency.whisper)
+        data = file[1] if isinstance(file, tuple) else file.read()
+        return SimpleNamespace(text=data.decode())
+
+    def _complete(self, model, messages, **kwargs):
+        _sleep(self.latency.llm)
+        match = re.search(r'Input: "(.*)"', messages[-1]["content"])
+        intent = fake_intent(match.group(1) if match else "")
+        message = SimpleNamespace(content=json.dumps(intent))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def fake_intent(text: str) -> dict:
+    """Deterministic intent for the synthetic utterances the harness generates."""
+    lowered = text.lower()
+    if lowered.startswith("show"):
+        return {"action": "list_leads"}
+    if lowered.startswith("find"):
+        return {"action": "search_leads", "query": text.split(" ", 1)[1] if " " in text else ""}
+    if lowered.startswith("add"):
+        lead = parse_lead_from_text(text)
+        return {"action": "add_lead", **lead, "follow_up_date": None} if lead else {"action": "unknown"}
+    if lowered.startswith("update"):
+        update = parse_update_from_text(text)
+        return {"action": "update_lead", **update, "follow_up_date": None} if update else {"action": "unknown"}
+    name = parse_done_from_text(text)
+    if name:
+        return {"action": "done_lead", "name": name, "status": "won"}
+    return {"action": "unknown"}
+
+
+# httpx (voice file download)
+
+class FakeHttpx:
+    """Replaces the httpx module in voice.py; the "audio" is the utterance text stored by FakeBot."""
+
+    def __init__(self, latency: Latency, bot: "FakeBot"):
+        self.latency = latency
+        self.bot = bot
+
+    def AsyncClient(self, *args, **kwargs):
+        return _FakeAsyncClient(self)
+
+
+class _FakeAsyncClient:
+    def __init__(self, owner: FakeHttpx):
+        self.owner = owner
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, url, **kwargs):
+        await asyncio.sleep(self.owner.latency.download)
+        file_id = url.rsplit("/", 1)[-1].removesuffix(".ogg")
+        return SimpleNamespace(content=self.owner.bot.voice_files[file_id].encode(), status_code=200)
+
+
+# Telegram
+
+class FakeBot:
+    """The subset of telegram.Bot used by handlers and scheduler jobs."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.voice_files = {}
+        self.sent = 0
+
+    async def get_file(self, file_id):
+        await asyncio.sleep(self.latency.telegram)
+        return SimpleNamespace(file_id=file_id, file_path=f"https://fake.telegram/voice/{file_id}.ogg")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency.telegram)
+        self.sent += 1
+        return SimpleNamespace(chat_id=chat_id, text=text, **kwargs)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await asyncio.sleep(self.latency.telegram)
+        self.sent += 1
+        return SimpleNamespace(chat_id=chat_id, document=document.read(), **kwargs)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await asyncio.sleep(self.latency.telegram)
+        return SimpleNamespace(chat_id=chat_id, message_id=message_id, text=text, **kwargs)
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None, **kwargs):
+        await asyncio.sleep(self.latency.telegram)
+        return SimpleNamespace(chat_id=chat_id, message_id=message_id, reply_markup=reply_markup)
+
+
+class FakeMessage:
+    def __init__(self, bot: FakeBot, chat_id: int, text: str = None, voice=None, reply_markup=None):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.chat = SimpleNamespace(id=chat_id)
+        self.message_id = 1
+        self.text = text
+        self.voice = voice
+        self.reply_markup = reply_markup
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot: FakeBot, telegram_id: int, data: str, reply_markup):
+        self.bot = bot
+        self.data = data
+        self.from_user = SimpleNamespace(id=telegram_id)
+        self.message = FakeMessage(bot, telegram_id, reply_markup=reply_markup)
+
+    def get_bot(self):
+        return self.bot
+
+    async def answer(self, text=None, **kwargs):
+        await asyncio.sleep(self.bot.latency.telegram)
+
+
+def make_update(bot: FakeBot, telegram_id: int, text: str = None, voice_text: str = None,
+                callback_data: str = None, reply_markup=None):
+    """Build a duck-typed telegram.Update for one synthetic text, voice or callback update."""
+    user = SimpleNamespace(id=telegram_id)
+    update = SimpleNamespace(
+        effective_user=user, effective_chat=SimpleNamespace(id=telegram_id), message=None, callback_query=None,
+        get_bot=lambda: bot
+    )
+    if callback_data:
+        update.callback_query = FakeCallbackQuery(bot, telegram_id, callback_data, reply_markup)
+    elif voice_text is not None:
+        file_id = f"voice{len(bot.voice_files)}"
+        bot.voice_files[file_id] = voice_text
+        voice = SimpleNamespace(file_id=file_id, duration=3)
+        update.message = FakeMessage(bot, telegram_id, voice=voice)
+    else:
+        update.message = FakeMessage(bot, telegram_id, text=text)
+    return update
+
+
+def make_context(bot: FakeBot, args: list | None = None):
+    return SimpleNamespace(bot=bot, args=args or [], user_data={}, chat_data={}, bot_data={})
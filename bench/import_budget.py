@@ -0,0 +1,86 @@
+"""Import-time budget check for the bot's own modules.
+
+    python -m bench.import_budget            # report, exit 1 if over budget
+    python -m bench.import_budget --top 20   # also list the 20 slowest imports overall
+
+Runs `python -X importtime -c "import bot"` in a clean subprocess (no
+credentials in the environment) and compares each module's cumulative import
+time against IMPORT_BUDGET_MS. The Supabase and Groq SDKs are imported
+lazily, so neither should appear at all.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# Cumulative milliseconds, including everything the module imports first.
+# telegram (and the httpx stack under it) dominates bot; the rest should be near zero.
+IMPORT_BUDGET_MS = {
+    "bot": 600,
+    "config": 50,
+    "database": 20,
+    "voice": 20,
+    "scheduler": 20,
+    "metrics": 30,
+    "tracing": 30,
+    "log": 20,
+}
+
+# Must never be imported just by importing the bot.
+# (apscheduler is not listed: telegram.ext imports it itself for its JobQueue.)
+DEFERRED_MODULES = ("supabase", "groq")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure(target: str = "bot") -> list[tuple[str, int, int, int]]:
+    """Return (module, self_us, cumulative_us, depth) for every import triggered by `import target`."""
+    env = {k: v for k, v in os.environ.items() if k not in ("SUPABASE_URL", "SUPABASE_KEY", "GROQ_API_KEY")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {target} failed:\n{proc.stderr}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports overall")
+    args = parser.parse_args()
+
+    rows = measure()
+    by_module = {module: cumulative_us for module, _, cumulative_us, _ in rows}
+    failures = []
+
+    print(f"{'module':<12}{'ms':>9}{'budget':>9}")
+    for module, budget_ms in IMPORT_BUDGET_MS.items():
+        ms = by_module.get(module, 0) / 1000
+        flag = "" if ms <= budget_ms else "  OVER"
+        if flag:
+            failures.append(module)
+        print(f"{module:<12}{ms:>9.1f}{budget_ms:>9}{flag}")
+
+    eager = sorted({m.split(".")[0] for m in by_module} & set(DEFERRED_MODULES))
+    if eager:
+        failures.extend(eager)
+        print(f"\nImported eagerly (should be deferred): {', '.join(eager)}")
+
+    if args.top:
+        print(f"\nSlowest {args.top} imports (cumulative):")
+        for module, _, cumulative_us, _ in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {module}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
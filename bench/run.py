@@ -0,0 +1,235 @@
+"""Replay synthetic update streams and digest runs against the real handlers, fully offline.
+
+    python -m bench.run
+    python -m bench.run --updates 5000 --concurrency 8 --whisper-latency 0.3
+    python -m bench.run --digest-users 100,1000 --db-latency 0.005
+
+Reports throughput and p50/p95/p99 latency per handler, plus wall-clock
+duration of each scheduler job for every digest size.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date, timedelta
+
+import bot
+import config
+import database
+import scheduler
+import voice
+from admission import VoiceQueue
+from outbox import outbox
+from bench.fakes import (
+    Latency, FakeSupabase, FakeGroq, FakeHttpx, FakeBot, make_update, make_context
+)
+
+FIRST_NAMES = ["John", "Mei", "Arjun", "Siti", "Kenji", "Priya", "Wei", "Aisha", "Tom", "Linh"]
+COMPANIES = ["Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Tyrell", "Hooli"]
+
+# (kind, weight) of the synthetic update mix
+UPDATE_MIX = [
+    ("leads", 12), ("today", 12), ("stats", 3), ("search", 3), ("add", 10), ("done", 5),
+    ("voice", 30), ("callback", 25),
+]
+
+
+def install_fakes(latency: Latency) -> tuple[FakeSupabase, FakeBot]:
+    """Point database.py and voice.py at fresh fakes; returns the fake DB and bot."""
+    db = FakeSupabase(latency)
+    fake_bot = FakeBot(latency)
+    database._client = db
+    voice._client = FakeGroq(latency)
+    voice.httpx = FakeHttpx(latency, fake_bot)
+    return db, fake_bot
+
+
+def seed(db: FakeSupabase, users: int, leads_per_user: int, rng: random.Random) -> list[dict]:
+    """Insert users with a spread of overdue, due-today and future leads, bypassing injected latency."""
+    today = date.today()
+    user_rows = []
+    for i in range(users):
+        user = db.table("users").table.insert({"telegram_id": 10_000 + i, "name": f"Rep {i}"})
+        user_rows.append(user)
+        for j in range(leads_per_user):
+            db.table("leads").table.insert({
+                "user_id": user["id"],
+                "name": f"{rng.choice(FIRST_NAMES)}{j}",
+                "company": rng.choice(COMPANIES),
+                "next_steps": "Send proposal",
+                "status": "active",
+                "follow_up_date": (today + timedelta(days=rng.randint(-3, 7))).isoformat(),
+            })
+    return user_rows
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_stream(db: FakeSupabase, fake_bot: FakeBot, users: list[dict], count: int, rng: random.Random):
+    """Yield (handler name, handler, update, context) tuples for a weighted random update mix."""
+    kinds, weights = zip(*UPDATE_MIX)
+    leads_table = db.tables["leads"]
+    for _ in range(count):
+        user = rng.choice(users)
+        telegram_id = user["telegram_id"]
+        active = [lead for lead in leads_table.by_user.get(user["id"], {}).values() if lead["status"] == "active"]
+        kind = rng.choices(kinds, weights)[0]
+        if kind in ("done", "callback") and not active:
+            kind = "add"
+        lead = rng.choice(active) if active else None
+
+        if kind == "leads":
+            yield "leads_command", bot.leads_command, make_update(fake_bot, telegram_id, "/leads"), make_context(fake_bot)
+        elif kind == "today":
+            yield "today_command", bot.today_command, make_update(fake_bot, telegram_id, "/today"), make_context(fake_bot)
+        elif kind == "stats":
+            yield "stats_command", bot.stats_command, make_update(fake_bot, telegram_id, "/stats"), make_context(fake_bot)
+        elif kind == "search":
+            args = [rng.choice(COMPANIES), "proposal"]
+            yield "search_command", bot.search_command, make_update(fake_bot, telegram_id, "/search"), make_context(fake_bot, args)
+        elif kind == "add":
+            args = f"{rng.choice(FIRST_NAMES)} | {rng.choice(COMPANIES)} | Call back | {date.today().isoformat()}".split()
+            yield "add_command", bot.add_command, make_update(fake_bot, telegram_id, "/add"), make_context(fake_bot, args)
+        elif kind == "done":
+            args = [str(lead["id"]), rng.choice(["won", "lost"])]
+            yield "done_command", bot.done_command, make_update(fake_bot, telegram_id, "/done"), make_context(fake_bot, args)
+        elif kind == "voice":
+            utterance = rng.choice([
+                f"Add lead {rng.choice(FIRST_NAMES)} at {rng.choice(COMPANIES)}, need to send proposal",
+                "Show my leads",
+                f"Find {rng.choice(COMPANIES)} proposal",
+                f"Update {lead['name'] if lead else 'John'} - meeting scheduled",
+                f"Done with {lead['name'] if lead else 'John'}",
+            ])
+            yield "handle_voice", bot.handle_voice, make_update(fake_bot, telegram_id, voice_text=utterance), make_context(fake_bot)
+        else:
+            action = rng.choice(["won", "lost", "snooze1d", "snooze1w"])
+            update = make_update(
+                fake_bot, telegram_id,
+                callback_data=f"lead:{action}:{lead['id']}",
+                reply_markup=scheduler.lead_actions_keyboard([lead]),
+            )
+            yield "lead_action_callback", bot.lead_action_callback, update, make_context(fake_bot)
+
+
+def make_voice_queue(production_limits: bool) -> VoiceQueue:
+    """The bot's voice queue; without production limits only the worker count applies."""
+    if production_limits:
+        return VoiceQueue(
+            config.VOICE_MAX_SECONDS, config.VOICE_USER_PER_MINUTE, config.VOICE_USER_BURST,
+            config.VOICE_MAX_QUEUED_PER_USER, config.VOICE_MAX_QUEUE,
+            config.GROQ_WHISPER_RPM, config.GROQ_LLM_RPM, config.VOICE_WORKERS,
+        )
+    unlimited = 1e9
+    return VoiceQueue(unlimited, unlimited, unlimited, unlimited, unlimited, unlimited, unlimited, config.VOICE_WORKERS)
+
+
+async def replay(stream, concurrency: int, production_limits: bool = False) -> tuple[dict, float, int]:
+    """Run every update through its handler; returns per-handler latencies, wall time and error count.
+
+    handle_voice only admits notes to the voice queue, so the queued work is
+    timed separately as process_voice and the run waits for the queue to drain.
+    Replies go through the outbox, so handler latency excludes Telegram sends;
+    the wall time includes flushing them.
+    """
+    latencies = {}
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    process_voice = bot.process_voice
+
+    async def timed_process_voice(*args):
+        start = time.perf_counter()
+        try:
+            await process_voice(*args)
+        finally:
+            latencies.setdefault("process_voice", []).append(time.perf_counter() - start)
+
+    bot.process_voice = timed_process_voice
+    bot.voice_queue = make_voice_queue(production_limits)
+    bot.voice_queue.start()
+
+    async def run_one(name, handler, update, context):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await handler(update, context)
+            except Exception:
+                errors += 1
+            latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_one(*item) for item in stream))
+        await bot.voice_queue.join()
+        await outbox.join()
+    finally:
+        await bot.voice_queue.stop()
+        bot.process_voice = process_voice
+    return latencies, time.perf_counter() - start, errors
+
+
+async def bench_handlers(args, latency: Latency, rng: random.Random):
+    db, fake_bot = install_fakes(latency)
+    users = seed(db, args.users, args.leads_per_user, rng)
+    stream = list(build_stream(db, fake_bot, users, args.updates, rng))
+    latencies, elapsed, errors = await replay(stream, args.concurrency, args.admission)
+
+    total = len(stream)
+    print(f"\nHandlers: {total} updates in {elapsed:.2f}s "
+          f"({total / elapsed:.1f} updates/s, concurrency {args.concurrency}, {errors} errors)")
+    print(f"{'handler':<22}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'upd/s':>9}")
+    for name, samples in sorted(latencies.items()):
+        print(f"{name:<22}{len(samples):>7}"
+              f"{percentile(samples, 50) * 1000:>10.1f}"
+              f"{percentile(samples, 95) * 1000:>10.1f}"
+              f"{percentile(samples, 99) * 1000:>10.1f}"
+              f"{len(samples) / sum(samples):>9.1f}")
+
+
+async def bench_digests(args, latency: Latency, rng: random.Random):
+    print(f"\nDigests ({args.leads_per_user} leads/user):")
+    print(f"{'users':>7}  {'job':<22}{'seconds':>9}{'sent':>8}{'db calls':>10}")
+    for size in args.digest_users:
+        for job in (scheduler.send_morning_digest, scheduler.send_evening_digest, scheduler.send_sunday_preview):
+            db, fake_bot = install_fakes(latency)
+            seed(db, size, args.leads_per_user, rng)
+            start = time.perf_counter()
+            await job(fake_bot)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>7}  {job.__name__:<22}{elapsed:>9.2f}{fake_bot.sent:>8}{db.calls:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000, help="synthetic updates to replay")
+    parser.add_argument("--users", type=int, default=50, help="registered users in the update stream")
+    parser.add_argument("--leads-per-user", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1, help="updates in flight at once")
+    parser.add_argument("--digest-users", type=lambda s: [int(n) for n in s.split(",") if n], default=[100, 1000, 10000],
+                        help="comma-separated user counts for digest runs (empty to skip)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--admission", action="store_true",
+                        help="apply the configured voice rate limits and Groq budget (default: workers only)")
+    for field, default in vars(Latency()).items():
+        parser.add_argument(f"--{field}-latency", type=float, default=default, help=f"seconds per {field} call")
+    args = parser.parse_args()
+
+    latency = Latency(**{field: getattr(args, f"{field}_latency") for field in vars(Latency())})
+    rng = random.Random(args.seed)
+
+    async def run():
+        await bench_handlers(args, latency, rng)
+        if args.digest_users:
+            await bench_digests(args, latency, rng)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,10 @@
-from datetime import datetime, date
+import functools
+import io
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, date, timedelta
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
@@ -6,18 +12,95 @@ from telegram.ext import (
     ConversationHandler, filters, ContextTypes
 )
 
-from config import TELEGRAM_BOT_TOKEN
+from config import (
+    TELEGRAM_BOT_TOKEN, METRICS_HOST, METRICS_PORT, LOG_LEVEL, MANAGER_TELEGRAM_IDS,
+    VOICE_MAX_SECONDS, VOICE_USER_PER_MINUTE, VOICE_USER_BURST, VOICE_MAX_QUEUED_PER_USER, VOICE_MAX_QUEUE,
+    VOICE_WORKERS, VOICE_SHUTDOWN_SECONDS, GROQ_WHISPER_RPM, GROQ_LLM_RPM
+)
 from database import (
-    get_user, create_user, set_ooo, add_lead, get_leads, 
-    update_lead, get_lead_by_id, get_leads_due_today, get_overdue_leads
+    get_user, create_user, get_all_users, set_ooo, add_lead, add_leads, get_leads, iter_leads,
+    update_lead, update_user_lead, get_lead_by_id, get_leads_due_today, get_overdue_leads,
+    get_pipeline_stats, search_leads
+)
+from leads_csv import (
+    parse_leads_csv, write_leads_csv, CsvImportError, MAX_IMPORT_BYTES, EXPORT_SPOOL_BYTES
 )
-from voice import transcribe_voice, parse_intent_with_llm
-from scheduler import setup_scheduler
+from voice import transcribe_voice, parse_intent_with_llm, voice_stage
+from scheduler import setup_scheduler, lead_actions_keyboard
+from metrics import instrument, start_metrics_server, HANDLER_SECONDS, HANDLER_ERRORS, COLD_START_SECONDS
+from tracing import setup_tracing, shutdown_tracing, trace_update
+from admission import VoiceQueue, AdmissionRejected
+from outbox import outbox
+from log import setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _process_start_time() -> float:
+    """Unix time this process was launched (from /proc on Linux), or now if unavailable."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_STARTED_AT = _process_start_time()
 
 # Conversation states
 AWAITING_CONTINUE = 0
 AWAITING_NAME = 1
 
+# Snooze buttons on digest / /today items, in days from today
+SNOOZE_DAYS = {"snooze1d": 1, "snooze1w": 7}
+
+SEARCH_PAGE_SIZE = 5
+# Recent queries kept per user for Prev/More buttons; buttons on older result messages expire
+MAX_SAVED_SEARCHES = 10
+
+voice_queue = VoiceQueue(
+    max_seconds=VOICE_MAX_SECONDS,
+    user_per_minute=VOICE_USER_PER_MINUTE,
+    user_burst=VOICE_USER_BURST,
+    max_queued_per_user=VOICE_MAX_QUEUED_PER_USER,
+    max_queue=VOICE_MAX_QUEUE,
+    whisper_rpm=GROQ_WHISPER_RPM,
+    llm_rpm=GROQ_LLM_RPM,
+    workers=VOICE_WORKERS,
+)
+
+# Handler latency/errors land in bot_handler_seconds{handler=<function name>}
+_timed_handler = instrument(HANDLER_SECONDS, HANDLER_ERRORS, label="handler")
+
+
+def _handler(fn):
+    """Wrap a Telegram handler in a root trace span and latency metrics."""
+    handler = trace_update(_timed_handler(fn))
+    
+    @functools.wraps(fn)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        try:
+            return await handler(update, context)
+        finally:
+            if not COLD_START_SECONDS.value():
+                COLD_START_SECONDS.set(time.time() - PROCESS_STARTED_AT)
+                logger.info("First update handled", extra={"cold_start_seconds": round(COLD_START_SECONDS.value(), 3)})
+    return wrapper
+
+
+def reply(update: Update, text: str, **kwargs):
+    """Queue a message to the chat the update came from. Returns a future for the sent Message."""
+    return outbox.send_message(update.get_bot(), update.effective_chat.id, text, **kwargs)
+
+
+def edit_message(query, method: str, **kwargs):
+    """Queue an edit (edit_message_text / edit_message_reply_markup) of the message a button is on."""
+    message = query.message
+    return outbox.submit(query.get_bot(), message.chat_id, method, message_id=message.message_id, **kwargs)
+
 WELCOME_MESSAGE = """Welcome to the AsiaPac Sales Bot!
 
 I help you track leads and follow-ups using voice or text.
@@ -34,12 +117,13 @@ Reminders run Mon-Fri, Singapore time.
 Ready to get started?"""
 
 
+@_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command - show welcome or resume if already registered."""
     user = get_user(update.effective_user.id)
     
     if user:
-        await update.message.reply_text(
+        reply(update,
             f"Welcome back, {user['name']}! Send a voice note or type /help for commands."
         )
         return ConversationHandler.END
@@ -47,32 +131,33 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [[InlineKeyboardButton("Continue →", callback_data="continue_onboarding")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
-    await update.message.reply_text(WELCOME_MESSAGE, reply_markup=reply_markup)
+    reply(update, WELCOME_MESSAGE, reply_markup=reply_markup)
     return AWAITING_CONTINUE
 
 
+@_handler
 async def continue_onboarding(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle continue button press."""
     query = update.callback_query
     await query.answer()
     
-    print(f"Continue pressed by {query.from_user.id}, moving to AWAITING_NAME")
-    await query.edit_message_text("What's your name?")
+    logger.info("Continue pressed, moving to AWAITING_NAME", extra={"telegram_id": query.from_user.id})
+    edit_message(query, "edit_message_text", text="What's your name?")
     return AWAITING_NAME
 
 
+@_handler
 async def receive_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receive name and complete registration."""
-    print(f"receive_name called with: {update.message.text}")
     name = update.message.text.strip()
     
     if len(name) < 2 or len(name) > 50:
-        await update.message.reply_text("Please enter a valid name (2-50 characters).")
+        reply(update, "Please enter a valid name (2-50 characters).")
         return AWAITING_NAME
     
     create_user(update.effective_user.id, name)
     
-    await update.message.reply_text(
+    reply(update,
         f"Great, {name}! You're all set.\n\n"
         "Send me a voice note like:\n"
         "'Add lead John at Acme, need to send proposal'\n\n"
@@ -81,6 +166,7 @@ async def receive_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+@_handler
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show help message."""
     help_text = """Commands & Voice Examples:
@@ -97,6 +183,10 @@ LIST LEADS:
 • Voice: "Show my leads"
 • Text: /leads
 
+SEARCH:
+• Voice: "Find the one about the pricing proposal"
+• Text: /search pricing proposal
+
 MARK COMPLETE:
 • Voice: "Done with John" or "Won John"
 • Text: /done 1 won
@@ -106,23 +196,31 @@ OUT OF OFFICE:
 • Text: /ooo 2024-01-15 (or /ooo off to disable)
 
 VIEW TODAY:
-• /today - See today's follow-ups"""
+• /today - See today's follow-ups
+
+PIPELINE STATS:
+• /stats - Your active/won/lost counts (/stats team for managers)
+
+IMPORT / EXPORT:
+• Upload a .csv with columns name, company, next_steps, follow_up_date
+• /export - Download your leads as CSV (/export team for managers)"""
     
-    await update.message.reply_text(help_text)
+    reply(update, help_text)
 
 
+@_handler
 async def add_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /add command: /add Name | Company | Next Steps | YYYY-MM-DD (optional)"""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
         return
     
     args = " ".join(context.args) if context.args else ""
     parts = [p.strip() for p in args.split("|")]
     
     if len(parts) < 3:
-        await update.message.reply_text(
+        reply(update,
             "Usage: /add Name | Company | Next Steps | YYYY-MM-DD (date optional)\n"
             "Example: /add John | Acme Corp | Send proposal | 2024-01-15"
         )
@@ -135,7 +233,7 @@ async def add_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             follow_up = datetime.strptime(parts[3], "%Y-%m-%d").date()
         except ValueError:
-            await update.message.reply_text("Invalid date format. Use YYYY-MM-DD.")
+            reply(update, "Invalid date format. Use YYYY-MM-DD.")
             return
     
     lead = add_lead(user["id"], name, company, next_steps, follow_up)
@@ -144,20 +242,21 @@ async def add_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if follow_up:
         msg += f"\nFollow-up: {follow_up}"
     
-    await update.message.reply_text(msg)
+    reply(update, msg)
 
 
+@_handler
 async def leads_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all active leads."""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
         return
     
     leads = get_leads(user["id"], status="active")
     
     if not leads:
-        await update.message.reply_text("No active leads. Add one with a voice note or /add.")
+        reply(update, "No active leads. Add one with a voice note or /add.")
         return
     
     msg = f"Your active leads ({len(leads)}):\n\n"
@@ -167,21 +266,98 @@ async def leads_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             line += f"\n   📅 {lead['follow_up_date']}"
         msg += line + "\n\n"
     
-    await update.message.reply_text(msg)
+    reply(update, msg)
+
 
+def save_search(context: ContextTypes.DEFAULT_TYPE, query: str) -> int:
+    """Remember a search query in user_data and return the key its Prev/More buttons carry.
 
+    Callback data is capped at 64 bytes, so the query itself stays server-side.
+    """
+    searches = context.user_data.setdefault("searches", {})
+    key = context.user_data.get("search_seq", 0) + 1
+    context.user_data["search_seq"] = key
+    searches[key] = query
+    while len(searches) > MAX_SAVED_SEARCHES:
+        del searches[next(iter(searches))]
+    return key
+
+
+def search_page(user_id: int, query: str, page: int, key: int) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Render one page of search results, with Prev/More buttons (search:<key>:<page>) for search_page_callback."""
+    rows = search_leads(user_id, query, limit=SEARCH_PAGE_SIZE + 1, offset=page * SEARCH_PAGE_SIZE)
+    has_more = len(rows) > SEARCH_PAGE_SIZE
+    rows = rows[:SEARCH_PAGE_SIZE]
+    
+    if not rows:
+        return (f"No leads found for '{query}'." if page == 0 else "No more results."), None
+    
+    msg = f"🔍 Results for '{query}' (page {page + 1}):\n\n"
+    for lead in rows:
+        line = f"#{lead['id']} {lead['name']} ({lead['company']})\n   → {lead['next_steps']}"
+        if lead["status"] != "active":
+            line += f"\n   [{lead['status']}]"
+        elif lead.get("follow_up_date"):
+            line += f"\n   📅 {lead['follow_up_date']}"
+        msg += line + "\n\n"
+    
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀ Prev", callback_data=f"search:{key}:{page - 1}"))
+    if has_more:
+        buttons.append(InlineKeyboardButton("More ▶", callback_data=f"search:{key}:{page + 1}"))
+    return msg, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+@_handler
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Full-text search over your leads: /search keywords"""
+    user = get_user(update.effective_user.id)
+    if not user:
+        reply(update, "Please /start first to register.")
+        return
+    
+    query = " ".join(context.args).strip() if context.args else ""
+    if not query:
+        reply(update, "Usage: /search keywords\nExample: /search pricing proposal")
+        return
+    
+    msg, reply_markup = search_page(user["id"], query, 0, save_search(context, query))
+    reply(update, msg, reply_markup=reply_markup)
+
+
+@_handler
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle Prev/More buttons on search results: callback_data is search:<key>:<page>."""
+    query = update.callback_query
+    parts = query.data.split(":")
+    # Buttons from before keys were added carry only the page, so they've expired too
+    key, page = (int(parts[1]), int(parts[2])) if len(parts) == 3 else (None, 0)
+    search_query = context.user_data.get("searches", {}).get(key)
+    
+    user = get_user(query.from_user.id)
+    if not user or not search_query:
+        await query.answer("Search expired. Run /search again.", show_alert=True)
+        return
+    
+    await query.answer()
+    msg, reply_markup = search_page(user["id"], search_query, page, key)
+    edit_message(query, "edit_message_text", text=msg, reply_markup=reply_markup)
+
+
+@_handler
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show today's follow-ups and overdue."""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
         return
     
     today_leads = get_leads_due_today(user["id"])
     overdue = get_overdue_leads(user["id"])
     
     if not today_leads and not overdue:
-        await update.message.reply_text("Nothing due today! 🎉")
+        reply(update, "Nothing due today! 🎉")
         return
     
     msg = ""
@@ -196,18 +372,54 @@ async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         for lead in today_leads:
             msg += f"  • #{lead['id']} {lead['name']} ({lead['company']}) - {lead['next_steps']}\n"
     
-    await update.message.reply_text(msg)
+    reply(update, msg, reply_markup=lead_actions_keyboard(overdue + today_leads))
+
+
+@_handler
+async def lead_action_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle Won / Lost / Snooze buttons: callback_data is lead:<action>:<lead_id>."""
+    query = update.callback_query
+    _, action, lead_id = query.data.split(":")
+    lead_id = int(lead_id)
+    
+    user = get_user(query.from_user.id)
+    if not user:
+        await query.answer("Please /start first to register.", show_alert=True)
+        return
+    
+    if action in SNOOZE_DAYS:
+        follow_up = date.today() + timedelta(days=SNOOZE_DAYS[action])
+        lead = update_user_lead(lead_id, user["id"], follow_up_date=follow_up)
+        feedback = f"Snoozed until {follow_up.strftime('%a, %b %d')}"
+    else:
+        lead = update_user_lead(lead_id, user["id"], status=action)
+        feedback = "Marked WON! 🎉" if action == "won" else "Marked lost."
+    
+    # Nothing matched: the lead was closed (and maybe archived) since the message was sent
+    if lead:
+        await query.answer(f"{lead['name']}: {feedback}")
+    else:
+        await query.answer("Already closed.", show_alert=True)
+    
+    # Drop the handled (or stale) lead's row so the remaining buttons stay accurate
+    suffix = f":{lead_id}"
+    rows = [
+        row for row in query.message.reply_markup.inline_keyboard
+        if not row[0].callback_data.endswith(suffix)
+    ]
+    edit_message(query, "edit_message_reply_markup", reply_markup=InlineKeyboardMarkup(rows) if rows else None)
 
 
+@_handler
 async def update_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Update a lead: /update ID field value"""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
         return
     
     if len(context.args) < 3:
-        await update.message.reply_text(
+        reply(update,
             "Usage: /update ID field value\n"
             "Fields: next_steps, follow_up (YYYY-MM-DD)\n"
             "Example: /update 1 next_steps Meeting scheduled"
@@ -217,12 +429,12 @@ async def update_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         lead_id = int(context.args[0])
     except ValueError:
-        await update.message.reply_text("Invalid lead ID.")
+        reply(update, "Invalid lead ID.")
         return
     
     lead = get_lead_by_id(lead_id)
     if not lead or lead["user_id"] != user["id"]:
-        await update.message.reply_text("Lead not found.")
+        reply(update, "Lead not found.")
         return
     
     field = context.args[1].lower()
@@ -235,35 +447,36 @@ async def update_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             follow_date = datetime.strptime(value, "%Y-%m-%d").date()
             update_lead(lead_id, follow_up_date=follow_date)
         except ValueError:
-            await update.message.reply_text("Invalid date. Use YYYY-MM-DD.")
+            reply(update, "Invalid date. Use YYYY-MM-DD.")
             return
     else:
-        await update.message.reply_text("Unknown field. Use: next_steps, follow_up")
+        reply(update, "Unknown field. Use: next_steps, follow_up")
         return
     
-    await update.message.reply_text(f"Updated #{lead_id}: {field} = {value}")
+    reply(update, f"Updated #{lead_id}: {field} = {value}")
 
 
+@_handler
 async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mark lead as won/lost: /done ID [won|lost]"""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
         return
     
     if not context.args:
-        await update.message.reply_text("Usage: /done ID [won|lost]\nExample: /done 1 won")
+        reply(update, "Usage: /done ID [won|lost]\nExample: /done 1 won")
         return
     
     try:
         lead_id = int(context.args[0])
     except ValueError:
-        await update.message.reply_text("Invalid lead ID.")
+        reply(update, "Invalid lead ID.")
         return
     
     lead = get_lead_by_id(lead_id)
     if not lead or lead["user_id"] != user["id"]:
-        await update.message.reply_text("Lead not found.")
+        reply(update, "Lead not found.")
         return
     
     status = "won"
@@ -271,50 +484,179 @@ async def done_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         status = context.args[1].lower()
     
     update_lead(lead_id, status=status)
-    await update.message.reply_text(f"Marked #{lead_id} {lead['name']} as {status.upper()}! 🎉" if status == "won" else f"Marked #{lead_id} {lead['name']} as {status}.")
+    reply(update, f"Marked #{lead_id} {lead['name']} as {status.upper()}! 🎉" if status == "won" else f"Marked #{lead_id} {lead['name']} as {status}.")
 
 
+@_handler
 async def ooo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set out of office: /ooo YYYY-MM-DD or /ooo off"""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
         return
     
     if not context.args:
         if user.get("ooo_until"):
-            await update.message.reply_text(f"You're OOO until {user['ooo_until']}. Use /ooo off to disable.")
+            reply(update, f"You're OOO until {user['ooo_until']}. Use /ooo off to disable.")
         else:
-            await update.message.reply_text("Usage: /ooo YYYY-MM-DD or /ooo off")
+            reply(update, "Usage: /ooo YYYY-MM-DD or /ooo off")
         return
     
     arg = context.args[0].lower()
     
     if arg == "off":
         set_ooo(update.effective_user.id, None)
-        await update.message.reply_text("OOO disabled. You'll receive reminders again.")
+        reply(update, "OOO disabled. You'll receive reminders again.")
         return
     
     try:
         ooo_date = datetime.strptime(arg, "%Y-%m-%d").date()
         if ooo_date < date.today():
-            await update.message.reply_text("OOO date must be in the future.")
+            reply(update, "OOO date must be in the future.")
             return
         set_ooo(update.effective_user.id, ooo_date)
-        await update.message.reply_text(f"OOO set until {ooo_date}. No reminders until then!")
+        reply(update, f"OOO set until {ooo_date}. No reminders until then!")
     except ValueError:
-        await update.message.reply_text("Invalid date. Use YYYY-MM-DD format.")
+        reply(update, "Invalid date. Use YYYY-MM-DD format.")
 
 
-async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle voice messages - transcribe and parse intent."""
+def format_stats_line(row: dict) -> str:
+    closed = row["won"] + row["lost"]
+    line = f"{row['active']} active ({row['overdue']} overdue), {row['won']} won, {row['lost']} lost"
+    if closed:
+        line += f", {round(100 * row['won'] / closed)}% win rate"
+    if row.get("avg_days_to_close") is not None:
+        line += f", {row['avg_days_to_close']}d to close"
+    return line
+
+
+@_handler
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Pipeline stats: /stats (yours) or /stats team (managers only)."""
+    user = get_user(update.effective_user.id)
+    if not user:
+        reply(update, "Please /start first to register.")
+        return
+    
+    team = bool(context.args) and context.args[0].lower() == "team"
+    if team and update.effective_user.id not in MANAGER_TELEGRAM_IDS:
+        reply(update, "Only managers can see team stats.")
+        return
+    
+    rows = get_pipeline_stats(None if team else user["id"])
+    if not rows:
+        reply(update, "No leads yet.")
+        return
+    
+    if not team:
+        reply(update, f"📊 Your pipeline:\n{format_stats_line(rows[0])}")
+        return
+    
+    names = {u["id"]: u["name"] for u in get_all_users()}
+    totals = {key: sum(row[key] for row in rows) for key in ("active", "overdue", "won", "lost")}
+    msg = f"📊 Team pipeline:\n{format_stats_line(totals)}\n\n"
+    for row in sorted(rows, key=lambda r: names.get(r["user_id"], "")):
+        msg += f"• {names.get(row['user_id'], row['user_id'])}: {format_stats_line(row)}\n"
+    reply(update, msg)
+
+
+@_handler
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Import leads from an uploaded CSV file."""
+    user = get_user(update.effective_user.id)
+    if not user:
+        reply(update, "Please /start first to register.")
+        return
+    
+    document = update.message.document
+    if document.file_size and document.file_size > MAX_IMPORT_BYTES:
+        reply(update, f"File too large (max {MAX_IMPORT_BYTES // 1024} KB).")
+        return
+    
+    file = await context.bot.get_file(document.file_id)
+    data = await file.download_as_bytearray()
+    
+    try:
+        leads, rejected = parse_leads_csv(bytes(data))
+    except CsvImportError as e:
+        reply(update, f"Couldn't import {document.file_name}: {e}")
+        return
+    
+    added = add_leads(user["id"], leads) if leads else 0
+    
+    msg = f"Imported {added} lead(s) from {document.file_name}."
+    if rejected:
+        msg += f"\n\nSkipped {len(rejected)} row(s):\n" + "\n".join(f"  • {r}" for r in rejected[:20])
+        if len(rejected) > 20:
+            msg += f"\n  …and {len(rejected) - 20} more"
+    reply(update, msg)
+
+
+@_handler
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Export leads as CSV: /export (yours) or /export team (managers only)."""
     user = get_user(update.effective_user.id)
     if not user:
-        await update.message.reply_text("Please /start first to register.")
+        reply(update, "Please /start first to register.")
+        return
+    
+    team = bool(context.args) and context.args[0].lower() == "team"
+    if team and update.effective_user.id not in MANAGER_TELEGRAM_IDS:
+        reply(update, "Only managers can export the team's leads.")
+        return
+    
+    rep_names = {u["id"]: u["name"] for u in get_all_users()} if team else None
+    
+    # Leads are fetched and written a page at a time; the spool only hits disk for large exports
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as spool:
+        out = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+        count = write_leads_csv(iter_leads(None if team else user["id"]), out, rep_names)
+        out.detach()
+        
+        if not count:
+            reply(update, "No leads to export.")
+            return
+        
+        spool.seek(0)
+        filename = f"leads-{'team' if team else 'mine'}-{date.today().isoformat()}.csv"
+        # Awaited so the spool stays open until the upload is done
+        await outbox.submit(
+            update.get_bot(), update.effective_chat.id, "send_document",
+            document=spool, filename=filename, caption=f"{count} lead(s)"
+        )
+
+
+@_handler
+async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admit a voice note to the voice queue; process_voice does the work once a worker picks it up."""
+    with voice_stage("get_user"):
+        user = get_user(update.effective_user.id)
+    if not user:
+        reply(update, "Please /start first to register.")
         return
     
     voice = update.message.voice
-    file = await context.bot.get_file(voice.file_id)
+    try:
+        ahead = voice_queue.submit(
+            user["id"], voice.duration, functools.partial(process_voice, update, context, user),
+            functools.partial(reply, update)
+        )
+    except AdmissionRejected as e:
+        reply(update, str(e))
+        return
+    
+    logger.info("Voice note received", extra={"file_id": voice.file_id, "duration": voice.duration, "ahead": ahead})
+    if ahead or voice_queue.budget_wait() >= 1:
+        reply(update, f"🎤 Queued ({ahead} ahead of you). I'll reply as soon as it's processed.")
+    else:
+        reply(update, "🎤 Processing...")
+
+
+async def process_voice(update: Update, context: ContextTypes.DEFAULT_TYPE, user: dict):
+    """Transcribe a voice note, parse the intent and act on it. Runs on a voice queue worker."""
+    voice = update.message.voice
+    with voice_stage("get_file"):
+        file = await context.bot.get_file(voice.file_id)
     
     # file.file_path might be full URL or relative path
     if file.file_path.startswith("http"):
@@ -322,27 +664,26 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         file_url = f"https://api.telegram.org/file/bot{TELEGRAM_BOT_TOKEN}/{file.file_path}"
     
-    print(f"Voice file URL: {file_url}")
-    await update.message.reply_text("🎤 Processing...")
-    
     try:
         text = await transcribe_voice(file_url, TELEGRAM_BOT_TOKEN)
     except Exception as e:
-        await update.message.reply_text(f"Couldn't transcribe audio: {e}")
+        reply(update, f"Couldn't transcribe audio: {e}")
         return
     
-    await update.message.reply_text(f"Heard: \"{text}\"")
+    reply(update, f"Heard: \"{text}\"")
     
     # Use LLM to parse intent (pass today's date for relative date calculation)
     today_str = date.today().strftime("%Y-%m-%d (%A)")  # e.g., "2026-01-03 (Saturday)"
-    intent = parse_intent_with_llm(text, today_str)
-    print(f"Parsed intent: {intent}")
+    with voice_stage("parse_intent"):
+        intent = await parse_intent_with_llm(text, today_str)
+    logger.info("Parsed intent", extra={"intent": intent})
     
     if not intent or intent.get("action") == "unknown":
-        await update.message.reply_text(
+        reply(update,
             "I didn't understand that. Try saying something like:\n"
             "• 'Add lead John at Acme, need to send proposal'\n"
             "• 'Show my leads'\n"
+            "• 'Find the one about the pricing proposal'\n"
             "• 'Done with John'\n"
             "• 'Update John - meeting scheduled'"
         )
@@ -362,7 +703,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             try:
                 follow_up = datetime.strptime(follow_up_date, "%Y-%m-%d").date()
             except ValueError:
-                print(f"Could not parse follow_up_date: {follow_up_date}")
+                logger.warning("Could not parse follow_up_date", extra={"follow_up_date": follow_up_date})
         
         lead = add_lead(user["id"], name, company, next_steps, follow_up)
         
@@ -371,17 +712,25 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             msg += f"\n  Follow-up: {follow_up.strftime('%A, %b %d')}"
         else:
             msg += f"\n\nSet follow-up with: /update {lead['id']} follow_up YYYY-MM-DD"
-        await update.message.reply_text(msg)
+        reply(update, msg)
     
     elif action == "list_leads":
         leads = get_leads(user["id"], status="active")
         if not leads:
-            await update.message.reply_text("No active leads.")
+            reply(update, "No active leads.")
         else:
             msg = f"Your leads ({len(leads)}):\n"
             for lead in leads:
                 msg += f"  • #{lead['id']} {lead['name']} ({lead['company']}) - {lead['next_steps']}\n"
-            await update.message.reply_text(msg)
+            reply(update, msg)
+    
+    elif action == "search_leads":
+        query = (intent.get("query") or "").strip()
+        if not query:
+            reply(update, "Couldn't tell what to search for. Try /search keywords")
+            return
+        msg, reply_markup = search_page(user["id"], query, 0, save_search(context, query))
+        reply(update, msg, reply_markup=reply_markup)
     
     elif action == "update_lead":
         name = intent.get("name", "")
@@ -389,7 +738,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         follow_up_date = intent.get("follow_up_date")
         
         if not name:
-            await update.message.reply_text("Couldn't determine which lead to update.")
+            reply(update, "Couldn't determine which lead to update.")
             return
         
         # Parse follow_up_date if provided
@@ -398,7 +747,7 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             try:
                 follow_up = datetime.strptime(follow_up_date, "%Y-%m-%d").date()
             except ValueError:
-                print(f"Could not parse follow_up_date: {follow_up_date}")
+                logger.warning("Could not parse follow_up_date", extra={"follow_up_date": follow_up_date})
             
         leads = get_leads(user["id"], status="active")
         matching = [l for l in leads if name.lower() in l["name"].lower() or name.lower() in l["company"].lower()]
@@ -417,24 +766,24 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     msg += f"\n  Next: {next_steps}"
                 if follow_up:
                     msg += f"\n  Follow-up: {follow_up.strftime('%A, %b %d')}"
-                await update.message.reply_text(msg)
+                reply(update, msg)
             else:
-                await update.message.reply_text("Nothing to update.")
+                reply(update, "Nothing to update.")
         elif len(matching) > 1:
             msg = "Multiple leads match. Which one?\n"
             for l in matching:
                 msg += f"  #{l['id']} {l['name']} ({l['company']})\n"
             msg += "\nUse: /update ID next_steps ..."
-            await update.message.reply_text(msg)
+            reply(update, msg)
         else:
-            await update.message.reply_text(f"No lead found matching '{name}'")
+            reply(update, f"No lead found matching '{name}'")
     
     elif action == "done_lead":
         name = intent.get("name", "")
         status = intent.get("status", "won")
         
         if not name:
-            await update.message.reply_text("Couldn't determine which lead to mark done.")
+            reply(update, "Couldn't determine which lead to mark done.")
             return
             
         leads = get_leads(user["id"], status="active")
@@ -443,32 +792,56 @@ async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if len(matching) == 1:
             update_lead(matching[0]["id"], status=status)
             emoji = "🎉" if status == "won" else ""
-            await update.message.reply_text(f"Marked {matching[0]['name']} as {status.upper()}! {emoji}")
+            reply(update, f"Marked {matching[0]['name']} as {status.upper()}! {emoji}")
         elif len(matching) > 1:
             msg = "Multiple leads match. Which one?\n"
             for l in matching:
                 msg += f"  #{l['id']} {l['name']} ({l['company']})\n"
             msg += "\nUse: /done ID [won|lost]"
-            await update.message.reply_text(msg)
+            reply(update, msg)
         else:
-            await update.message.reply_text(f"No lead found matching '{name}'")
+            reply(update, f"No lead found matching '{name}'")
 
 
+@_handler
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle plain text that isn't a command."""
-    print(f"handle_text called with: {update.message.text}")
     user = get_user(update.effective_user.id)
     if not user:
         # Might be name input during onboarding - let ConversationHandler handle it
-        print("User not found, ignoring in handle_text")
         return
     
-    await update.message.reply_text("Type /help to see what I can do, or send a voice note.")
+    reply(update, "Type /help to see what I can do, or send a voice note.")
+
+
+async def post_init(application: Application):
+    """Start background workers once the event loop is running."""
+    voice_queue.start()
+
+
+async def post_stop(application: Application):
+    """Let queued voice notes finish (for up to VOICE_SHUTDOWN_SECONDS), then flush replies, traces and logs.
+
+    Runs before Application.shutdown() closes the bot's HTTP client, so queued
+    replies can still be sent.
+    """
+    await voice_queue.stop(VOICE_SHUTDOWN_SECONDS)
+    await outbox.join()
+    logger.info("Bot stopped")
+    shutdown_tracing()
+    shutdown_logging()
 
 
 def main():
     """Start the bot."""
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    setup_logging(LOG_LEVEL)
+    setup_tracing()
+    
+    application = (
+        Application.builder().token(TELEGRAM_BOT_TOKEN)
+        .post_init(post_init).post_stop(post_stop)
+        .build()
+    )
     
     # Onboarding conversation
     onboarding_handler = ConversationHandler(
@@ -489,13 +862,23 @@ def main():
     application.add_handler(CommandHandler("update", update_command))
     application.add_handler(CommandHandler("done", done_command))
     application.add_handler(CommandHandler("ooo", ooo_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CallbackQueryHandler(search_page_callback, pattern=r"^search:\d+(:\d+)?$"))
+    application.add_handler(CallbackQueryHandler(lead_action_callback, pattern=r"^lead:(won|lost|snooze1d|snooze1w):\d+$"))
     application.add_handler(MessageHandler(filters.VOICE, handle_voice))
+    application.add_handler(MessageHandler(filters.Document.FileExtension("csv"), handle_document))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     
     # Setup scheduler
     setup_scheduler(application.bot)
     
-    print("Bot starting...")
+    if METRICS_PORT:
+        start_metrics_server(METRICS_HOST, METRICS_PORT)
+        logger.info(f"Metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    
+    logger.info("Bot starting...", extra={"startup_seconds": round(time.time() - PROCESS_STARTED_AT, 3)})
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
@@ -10,6 +10,45 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 TIMEZONE = "Asia/Singapore"
 
+# Telegram ids allowed to run team-wide commands (comma-separated)
+MANAGER_TELEGRAM_IDS = {int(i) for i in os.getenv("MANAGER_TELEGRAM_IDS", "").split(",") if i.strip()}
+
+# Voice admission control (see admission.py). Groq limits are requests per minute for the account.
+VOICE_MAX_SECONDS = int(os.getenv("VOICE_MAX_SECONDS", "120"))
+VOICE_USER_PER_MINUTE = float(os.getenv("VOICE_USER_PER_MINUTE", "4"))
+VOICE_USER_BURST = int(os.getenv("VOICE_USER_BURST", "3"))
+VOICE_MAX_QUEUED_PER_USER = int(os.getenv("VOICE_MAX_QUEUED_PER_USER", "3"))
+VOICE_MAX_QUEUE = int(os.getenv("VOICE_MAX_QUEUE", "100"))
+VOICE_WORKERS = int(os.getenv("VOICE_WORKERS", "2"))
+# On shutdown, how long queued voice notes get to finish before their users are asked to resend
+VOICE_SHUTDOWN_SECONDS = float(os.getenv("VOICE_SHUTDOWN_SECONDS", "20"))
+GROQ_WHISPER_RPM = float(os.getenv("GROQ_WHISPER_RPM", "20"))
+GROQ_LLM_RPM = float(os.getenv("GROQ_LLM_RPM", "30"))
+
+# Groq resilience (see resilience.py): per-call deadlines in seconds, hedge a call that runs
+# past this percentile of recent latencies, open the breaker after N consecutive failures.
+GROQ_WHISPER_DEADLINE = float(os.getenv("GROQ_WHISPER_DEADLINE", "20"))
+GROQ_LLM_DEADLINE = float(os.getenv("GROQ_LLM_DEADLINE", "8"))
+GROQ_HEDGE_PERCENTILE = float(os.getenv("GROQ_HEDGE_PERCENTILE", "95"))
+GROQ_BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", "5"))
+GROQ_BREAKER_RESET_SECONDS = float(os.getenv("GROQ_BREAKER_RESET_SECONDS", "30"))
+
+# Outbound message queue (see outbox.py): messages to one chat within the window are merged,
+# failed sends are retried with exponential backoff up to OUTBOX_MAX_ATTEMPTS.
+OUTBOX_COALESCE_MS = int(os.getenv("OUTBOX_COALESCE_MS", "250"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_MAX_BACKOFF_SECONDS", "30"))
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "20"))
+
+# How long /stats results are reused before re-running the aggregate query
+STATS_CACHE_SECONDS = int(os.getenv("STATS_CACHE_SECONDS", "300"))
+
+# Nightly archival of closed leads into leads_archive
+ARCHIVE_HOUR = 2
+ARCHIVE_MINUTE = 0
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "7"))
+
 # Digest times (24h format)
 MORNING_DIGEST_HOUR = 8
 MORNING_DIGEST_MINUTE = 30
@@ -17,3 +56,17 @@ EVENING_DIGEST_HOUR = 17
 EVENING_DIGEST_MINUTE = 30
 SUNDAY_PREVIEW_HOUR = 20
 SUNDAY_PREVIEW_MINUTE = 0
+
+# Prometheus-format /metrics endpoint (set METRICS_PORT=0 to disable)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Tracing: one OTLP/JSON line per kept trace, rotated by size.
+# Errored traces and traces slower than TRACE_SLOW_MS are always kept; the rest at TRACE_SAMPLE_RATE.
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_SLOW_MS = int(os.getenv("TRACE_SLOW_MS", "5000"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv("TRACE_BACKUP_COUNT", "5"))
@@ -1,48 +1,73 @@
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_KEY
+from config import SUPABASE_URL, SUPABASE_KEY, STATS_CACHE_SECONDS
 from datetime import date, datetime
+import time
+from metrics import instrument, DB_QUERY_SECONDS, DB_ERRORS
+from tracing import traced
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise Exception("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+_client = None
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# /stats results by (user_id (None = whole team), day): (expires_at monotonic, rows).
+# Overdue counts depend on the day, so an entry never outlives it.
+_stats_cache = {}
+
+
+def get_client():
+    """The shared Supabase client. Raises if SUPABASE_URL or SUPABASE_KEY is unset."""
+    global _client
+    if _client is None:
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise Exception("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+        from supabase import create_client  # heavy: pulls in postgrest, gotrue, storage, realtime
+        _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _client
+
+
+def _timed(fn):
+    """Time a query into bot_db_query_seconds{query=<function name>} and trace it as a db.<name> span."""
+    return traced(f"db.{fn.__name__}")(instrument(DB_QUERY_SECONDS, DB_ERRORS, label="query")(fn))
 
 
 # User operations
+@_timed
 def get_user(telegram_id: int):
-    result = supabase.table("users").select("*").eq("telegram_id", telegram_id).execute()
+    result = get_client().table("users").select("*").eq("telegram_id", telegram_id).execute()
     return result.data[0] if result.data else None
 
 
+@_timed
 def create_user(telegram_id: int, name: str):
-    result = supabase.table("users").insert({
+    result = get_client().table("users").insert({
         "telegram_id": telegram_id,
         "name": name
     }).execute()
     return result.data[0] if result.data else None
 
 
+@_timed
 def set_ooo(telegram_id: int, until_date: date | None):
-    supabase.table("users").update({
+    get_client().table("users").update({
         "ooo_until": until_date.isoformat() if until_date else None
     }).eq("telegram_id", telegram_id).execute()
 
 
+@_timed
 def get_active_users():
     """Get users not on OOO or whose OOO has expired."""
     today = date.today().isoformat()
-    result = supabase.table("users").select("*").or_(
+    result = get_client().table("users").select("*").or_(
         f"ooo_until.is.null,ooo_until.lte.{today}"
     ).execute()
     return result.data
 
 
+@_timed
 def get_all_users():
-    result = supabase.table("users").select("*").execute()
+    result = get_client().table("users").select("*").execute()
     return result.data
 
 
 # Lead operations
+@_timed
 def add_lead(user_id: int, name: str, company: str, next_steps: str, follow_up_date: date = None):
     data = {
         "user_id": user_id,
@@ -53,39 +78,175 @@ def add_lead(user_id: int, name: str, company: str, next_steps: str, follow_up_d
     }
     if follow_up_date:
         data["follow_up_date"] = follow_up_date.isoformat()
-    result = supabase.table("leads").insert(data).execute()
+    result = get_client().table("leads").insert(data).execute()
+    _invalidate_stats(user_id)
     return result.data[0] if result.data else None
 
 
-def get_leads(user_id: int, status: str = "active"):
-    result = supabase.table("leads").select("*").eq("user_id", user_id).eq("status", status).execute()
-    return result.data
+# Rows per multi-row insert in add_leads; keeps each request body well under PostgREST limits
+INSERT_BATCH_SIZE = 500
 
 
+@_timed
+def add_leads(user_id: int, leads: list[dict]) -> int:
+    """Insert many leads ({name, company, next_steps, follow_up_date}) in batched multi-row inserts. Returns rows inserted."""
+    rows = [{
+        "user_id": user_id,
+        "name": lead["name"],
+        "company": lead["company"],
+        "next_steps": lead["next_steps"],
+        "status": "active",
+        "follow_up_date": lead["follow_up_date"].isoformat() if lead.get("follow_up_date") else None,
+    } for lead in leads]
+    inserted = 0
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        result = get_client().table("leads").insert(rows[start:start + INSERT_BATCH_SIZE]).execute()
+        inserted += len(result.data)
+    _invalidate_stats(user_id)
+    return inserted
+
+
+@_timed
+def get_leads(user_id: int, status: str = "active"):
+    result = get_client().table("leads").select("*").eq("user_id", user_id).eq("status", status).execute()
+    if status == "active":
+        return result.data
+    # Closed leads live in leads until the nightly archive job moves them
+    archived = get_client().table("leads_archive").select("*").eq("user_id", user_id).eq("status", status).execute()
+    return result.data + archived.data
+
+
+@_timed
+def get_leads_page(user_id: int | None, after_id: int = 0, limit: int = 500, table: str = "leads"):
+    """One page of leads (any status) ordered by id, starting after after_id. user_id=None means all users."""
+    query = get_client().table(table).select("*").gt("id", after_id)
+    if user_id is not None:
+        query = query.eq("user_id", user_id)
+    return query.order("id").limit(limit).execute().data
+
+
+def iter_leads(user_id: int | None = None, page_size: int = 500):
+    """Yield every lead, live then archived, page by page (keyset pagination) so callers never hold the full table."""
+    for table in ("leads", "leads_archive"):
+        after_id = 0
+        while True:
+            page = get_leads_page(user_id, after_id, page_size, table)
+            yield from page
+            if len(page) < page_size:
+                break
+            after_id = page[-1]["id"]
+
+
+@_timed
 def get_lead_by_id(lead_id: int):
-    result = supabase.table("leads").select("*").eq("id", lead_id).execute()
+    result = get_client().table("leads").select("*").eq("id", lead_id).execute()
     return result.data[0] if result.data else None
 
 
+@_timed
 def update_lead(lead_id: int, **kwargs):
-    kwargs["updated_at"] = datetime.now().isoformat()
+    result = get_client().table("leads").update(_lead_update(kwargs)).eq("id", lead_id).execute()
+    for row in result.data:
+        _invalidate_stats(row["user_id"])
+
+
+@_timed
+def update_user_lead(lead_id: int, user_id: int, **kwargs):
+    """Update a lead only if it belongs to user_id and is still active. Returns the updated row, or None if nothing matched."""
+    result = (
+        get_client().table("leads").update(_lead_update(kwargs))
+        .eq("id", lead_id).eq("user_id", user_id).eq("status", "active").execute()
+    )
+    if result.data:
+        _invalidate_stats(user_id)
+    return result.data[0] if result.data else None
+
+
+def _lead_update(kwargs: dict) -> dict:
+    """Serialize an update payload; closing a lead stamps closed_at for time-to-close stats."""
+    now = datetime.now().isoformat()
+    kwargs["updated_at"] = now
     if "follow_up_date" in kwargs and kwargs["follow_up_date"]:
         kwargs["follow_up_date"] = kwargs["follow_up_date"].isoformat()
-    supabase.table("leads").update(kwargs).eq("id", lead_id).execute()
+    if kwargs.get("status") in ("won", "lost"):
+        kwargs["closed_at"] = now
+    return kwargs
 
 
+@_timed
 def get_leads_due_today(user_id: int):
     today = date.today().isoformat()
-    result = supabase.table("leads").select("*").eq("user_id", user_id).eq("status", "active").eq("follow_up_date", today).execute()
+    result = get_client().table("leads").select("*").eq("user_id", user_id).eq("status", "active").eq("follow_up_date", today).execute()
     return result.data
 
 
+@_timed
 def get_leads_due_this_week(user_id: int, start_date: date, end_date: date):
-    result = supabase.table("leads").select("*").eq("user_id", user_id).eq("status", "active").gte("follow_up_date", start_date.isoformat()).lte("follow_up_date", end_date.isoformat()).execute()
+    result = get_client().table("leads").select("*").eq("user_id", user_id).eq("status", "active").gte("follow_up_date", start_date.isoformat()).lte("follow_up_date", end_date.isoformat()).execute()
     return result.data
 
 
+@_timed
 def get_overdue_leads(user_id: int):
     today = date.today().isoformat()
-    result = supabase.table("leads").select("*").eq("user_id", user_id).eq("status", "active").lt("follow_up_date", today).execute()
+    result = get_client().table("leads").select("*").eq("user_id", user_id).eq("status", "active").lt("follow_up_date", today).execute()
+    return result.data
+
+
+# Archival
+@_timed
+def archive_closed_leads(batch_size: int, min_age_days: int) -> int:
+    """Move one batch of closed leads into leads_archive. Returns how many moved."""
+    result = get_client().rpc("archive_closed_leads", {
+        "p_batch_size": batch_size,
+        "p_min_age_days": min_age_days
+    }).execute()
+    return result.data or 0
+
+
+# Search
+@_timed
+def search_leads(user_id: int, query: str, limit: int = 5, offset: int = 0) -> list[dict]:
+    """Ranked full-text search over a user's leads via the search_leads SQL function (GIN-indexed)."""
+    result = get_client().rpc("search_leads", {
+        "p_user_id": user_id,
+        "p_query": query,
+        "p_limit": limit,
+        "p_offset": offset
+    }).execute()
+    return result.data
+
+
+# Stats
+def _invalidate_stats(user_id: int):
+    today = date.today()
+    _stats_cache.pop((user_id, today), None)
+    _stats_cache.pop((None, today), None)
+
+
+def get_pipeline_stats(user_id: int | None = None) -> list[dict]:
+    """Per-rep lead counts and close times from the pipeline_stats SQL function.
+
+    user_id=None returns a row for every rep. Results are cached for
+    STATS_CACHE_SECONDS, and never past the end of the day; a lead write drops
+    only its rep's entry and the team entry. Only cache misses are timed.
+    """
+    today = date.today()
+    cached = _stats_cache.get((user_id, today))
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    for key in [key for key in _stats_cache if key[1] != today]:
+        del _stats_cache[key]
+    rows = pipeline_stats(user_id, today)
+    _stats_cache[(user_id, today)] = (time.monotonic() + STATS_CACHE_SECONDS, rows)
+    return rows
+
+
+@_timed
+def pipeline_stats(user_id: int | None, today: date) -> list[dict]:
+    """Uncached pipeline_stats call; use get_pipeline_stats."""
+    result = get_client().rpc("pipeline_stats", {
+        "p_user_id": user_id,
+        "p_today": today.isoformat()
+    }).execute()
     return result.data
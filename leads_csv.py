@@ -0,0 +1,128 @@
+"""CSV import/export of leads.
+
+Import expects a header row with name, company, next_steps and optionally
+follow_up_date (YYYY-MM-DD); extra columns such as those written by export
+are ignored, so an exported file can be re-imported as-is. If the file has a
+status column, only active rows are imported; won and lost rows are rejected
+rather than brought back as active leads.
+
+Exported text that a spreadsheet would run as a formula is prefixed with a
+single quote; import strips that prefix again.
+"""
+import csv
+import io
+from datetime import datetime
+
+MAX_IMPORT_BYTES = 1024 * 1024
+MAX_IMPORT_ROWS = 2000
+# Exports are buffered in memory up to this size, then spill to a temp file on disk
+EXPORT_SPOOL_BYTES = 1024 * 1024
+
+REQUIRED_COLUMNS = ("name", "company", "next_steps")
+EXPORT_COLUMNS = ("id", "name", "company", "next_steps", "follow_up_date", "status", "created_at", "updated_at")
+
+MAX_FIELD_LENGTH = {"name": 200, "company": 200, "next_steps": 1000}
+
+# Cells starting with these are evaluated as formulas by Excel / Sheets / LibreOffice
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+# User-entered columns that get the formula guard on export
+TEXT_COLUMNS = ("rep", "name", "company", "next_steps")
+
+
+class CsvImportError(Exception):
+    """The file as a whole can't be imported (bad encoding, missing columns, too many rows)."""
+
+
+def parse_leads_csv(data: bytes) -> tuple[list[dict], list[str]]:
+    """Validate an uploaded CSV. Returns (leads ready for add_leads, human-readable rejection reasons)."""
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise CsvImportError("File must be UTF-8 encoded.")
+
+    reader = csv.DictReader(io.StringIO(text))
+    columns = [c.strip().lower() for c in reader.fieldnames or []]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise CsvImportError(f"Missing column(s): {', '.join(missing)}. Expected: name, company, next_steps, follow_up_date")
+    reader.fieldnames = columns
+
+    leads, rejected = [], []
+    records = 0
+    next_line = reader.line_num + 1
+    for row in reader:
+        # Report the file line a record starts on; quoted fields can span several lines
+        row_number, next_line = next_line, reader.line_num + 1
+        records += 1
+        if records > MAX_IMPORT_ROWS:
+            raise CsvImportError(f"Too many rows (max {MAX_IMPORT_ROWS}). Split the file and upload each part.")
+        values = {key: _unguard((value or "").strip()) for key, value in row.items() if key}
+        if not any(values.values()):
+            continue
+
+        error = None
+        status = values.get("status", "").lower()
+        if status and status != "active":
+            error = f"status is '{values['status']}' (only active leads are imported)"
+        elif not values.get("name"):
+            error = "missing name"
+        elif not values.get("company"):
+            error = "missing company"
+        else:
+            for field, limit in MAX_FIELD_LENGTH.items():
+                if len(values.get(field, "")) > limit:
+                    error = f"{field} longer than {limit} characters"
+                    break
+
+        follow_up = None
+        if not error and values.get("follow_up_date"):
+            try:
+                follow_up = datetime.strptime(values["follow_up_date"], "%Y-%m-%d").date()
+            except ValueError:
+                error = f"invalid follow_up_date '{values['follow_up_date']}' (use YYYY-MM-DD)"
+
+        if error:
+            rejected.append(f"Row {row_number}: {error}")
+            continue
+
+        leads.append({
+            "name": values["name"],
+            "company": values["company"],
+            "next_steps": values.get("next_steps") or "Follow up",
+            "follow_up_date": follow_up,
+        })
+    return leads, rejected
+
+
+def write_leads_csv(leads, out, rep_names: dict | None = None) -> int:
+    """Write leads (any iterable, consumed one row at a time) as CSV text to out. Returns rows written.
+
+    With rep_names ({user_id: name}) a leading "rep" column is added for team exports.
+    """
+    columns = (("rep",) if rep_names is not None else ()) + EXPORT_COLUMNS
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    count = 0
+    for lead in leads:
+        row = [lead.get(column) or "" for column in EXPORT_COLUMNS]
+        if rep_names is not None:
+            row.insert(0, rep_names.get(lead["user_id"], lead["user_id"]))
+        writer.writerow([
+            _guard(value) if column in TEXT_COLUMNS else value for column, value in zip(columns, row)
+        ])
+        count += 1
+    return count
+
+
+def _guard(value):
+    """Prefix text a spreadsheet would treat as a formula with ' so it is shown as text."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _unguard(value: str) -> str:
+    """Undo _guard for re-imported exports."""
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
@@ -0,0 +1,75 @@
+"""Non-blocking structured logging.
+
+Modules log through the standard logging module (logger = logging.getLogger(__name__)).
+setup_logging() points the root logger at a QueueHandler, so a handler only
+enqueues the record; a QueueListener thread formats each one as a JSON line
+(with the active trace/span ids and any extra= fields) and writes it to stderr.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from datetime import datetime, timezone
+
+from tracing import current_span
+
+# Attributes every LogRecord has; anything else came from extra= and is logged as a field
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _TraceContextFilter(logging.Filter):
+    """Stamp trace/span ids on the caller's thread, before the record crosses the queue."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        current = current_span()
+        if current is not None:
+            record.trace_id = current.trace_id
+            record.span_id = current.span_id
+        return True
+
+
+def setup_logging(level: str = "INFO"):
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.Queue(-1)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_TraceContextFilter())
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    # httpx logs every request URL at INFO, which includes the bot token
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
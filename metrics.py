@@ -0,0 +1,214 @@
+"""In-process metrics with a Prometheus text-format /metrics endpoint.
+
+Deliberately dependency-free: counters, gauges and histograms are plain dicts
+behind a lock, and the endpoint is a stdlib HTTP server on a daemon thread.
+"""
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers fast DB lookups up to slow whisper calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _label_key(labelnames: tuple, labels: dict) -> tuple:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, key: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(labelnames, key)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_label_key(self.labelnames, labels))
+        return state[-1] if state else 0
+
+    def samples(self):
+        for key, state in self._values.items():
+            for bound, count in zip(self.buckets, state):
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': bound})} {count}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, {'le': '+Inf'})} {state[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {state[-1]}"
+
+
+def instrument(histogram: Histogram, errors: Counter | None = None, label: str | None = None, **labels):
+    """Decorator timing a sync or async function into histogram (and counting exceptions into errors).
+
+    If label is given, that label is set to the wrapped function's name.
+    """
+    def decorator(fn):
+        fn_labels = dict(labels)
+        if label:
+            fn_labels[label] = fn.__name__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    if errors:
+                        errors.inc(**fn_labels)
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start, **fn_labels)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors:
+                    errors.inc(**fn_labels)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start, **fn_labels)
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for metric in _registry:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would drown the bot's own output
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    """Serve /metrics on a daemon thread so it never blocks the bot's event loop."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
+
+
+# Bot-wide metrics
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Telegram update handler latency", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Unhandled exceptions raised by handlers", ("handler",))
+VOICE_STAGE_SECONDS = Histogram("bot_voice_stage_seconds", "Latency of each stage of the voice pipeline", ("stage",))
+VOICE_ADMISSIONS = Counter("bot_voice_admissions_total", "Voice notes accepted or rejected by admission control", ("outcome",))
+VOICE_QUEUE_DEPTH = Gauge("bot_voice_queue_depth", "Voice notes waiting for a worker")
+VOICE_QUEUE_WAIT_SECONDS = Histogram("bot_voice_queue_wait_seconds", "Time voice notes spend queued before processing")
+PROVIDER_CALL_SECONDS = Histogram("bot_provider_call_seconds", "Successful Groq call latency, including hedges", ("call",))
+PROVIDER_FAILURES = Counter("bot_provider_failures_total", "Failed or refused Groq calls", ("call", "reason"))
+PROVIDER_HEDGES = Counter("bot_provider_hedges_total", "Hedged second requests sent to Groq", ("call",))
+PROVIDER_CIRCUIT_STATE = Gauge("bot_provider_circuit_state", "Circuit breaker state: 0 closed, 1 open, 2 half-open", ("call",))
+INTENT_FALLBACKS = Counter("bot_intent_fallbacks_total", "Voice intents parsed locally because the LLM was unavailable or its answer was malformed")
+OUTBOX_QUEUE_DEPTH = Gauge("bot_outbox_queue_depth", "Outbound messages queued or being sent")
+OUTBOX_SEND_SECONDS = Histogram("bot_outbox_send_seconds", "Latency of each Telegram send/edit API call", ("method",))
+OUTBOX_DELIVERY_SECONDS = Histogram("bot_outbox_delivery_seconds", "Time from queueing a message to its delivery, including retries")
+OUTBOX_RETRIES = Counter("bot_outbox_retries_total", "Retried Telegram calls", ("reason",))
+OUTBOX_FAILURES = Counter("bot_outbox_failures_total", "Outbound messages dropped after errors or retries ran out", ("method",))
+OUTBOX_COALESCED = Counter("bot_outbox_coalesced_total", "Messages merged into a preceding message to the same chat")
+DB_QUERY_SECONDS = Histogram("bot_db_query_seconds", "Latency of database.py operations", ("query",))
+DB_ERRORS = Counter("bot_db_errors_total", "Failed database.py operations", ("query",))
+COLD_START_SECONDS = Gauge("bot_cold_start_seconds", "Time from process launch to the first handled update")
+JOB_DURATION_SECONDS = Histogram(
+    "bot_job_duration_seconds", "Scheduler job run time", ("job",),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+)
+JOB_USERS = Counter("bot_job_users_total", "Users processed by scheduler jobs", ("job",))
+JOB_MESSAGES_SENT = Counter("bot_job_messages_sent_total", "Messages sent by scheduler jobs", ("job",))
+JOB_FAILURES = Counter("bot_job_failures_total", "Failed sends in scheduler jobs", ("job",))
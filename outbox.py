@@ -0,0 +1,223 @@
+"""Outbound message queue for every bot reply and scheduled message.
+
+Handlers and scheduler jobs queue Telegram calls here instead of awaiting
+them directly:
+
+- calls to one chat are sent in order, one at a time; different chats are
+  sent concurrently, up to OUTBOX_CONCURRENCY in flight
+- text messages queued for the same chat within OUTBOX_COALESCE_MS are
+  merged into one send, as long as the result fits in a single message
+- text longer than Telegram's 4096-character limit is split, preferring
+  line breaks; a keyboard goes on the last part
+- RetryAfter (flood control) pauses all sends for the time Telegram asks;
+  network errors and timeouts are retried with exponential backoff
+
+Each queued call returns a future with the sent Message (or the error), so
+callers that need to know the outcome can await it. Delivery is traced as a
+"reply" span in the trace of whichever update or job queued the message.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from config import OUTBOX_COALESCE_MS, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_CONCURRENCY
+from metrics import (
+    OUTBOX_QUEUE_DEPTH, OUTBOX_SEND_SECONDS, OUTBOX_DELIVERY_SECONDS, OUTBOX_RETRIES, OUTBOX_FAILURES,
+    OUTBOX_COALESCED
+)
+from tracing import capture, resume
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+# Merged messages are separated by a blank line
+MERGE_SEPARATOR = "\n\n"
+# First network retry waits about this long, doubling on each attempt
+BASE_BACKOFF_SECONDS = 0.5
+
+
+def split_text(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Split text into chunks of at most limit characters, at the last line break where possible."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+def _retrieve(future: asyncio.Future):
+    # Callers may never await a reply; failures are already logged, so don't warn about them again
+    if not future.cancelled():
+        future.exception()
+
+
+class _Outgoing:
+    """One queued Bot API call; several merged send_message calls share one _Outgoing."""
+
+    def __init__(self, bot, method: str, kwargs: dict):
+        self.bot = bot
+        self.method = method
+        self.kwargs = kwargs
+        self.futures = [asyncio.get_running_loop().create_future()]
+        self.queued_at = [time.monotonic()]
+        self.parents = [capture()]
+        self.futures[0].add_done_callback(_retrieve)
+
+    def can_merge(self, other: "_Outgoing") -> bool:
+        """Whether other's text can be appended to this message.
+
+        Messages with a keyboard are never merged: its buttons may later edit the
+        message text, which would wipe whatever was merged in with it.
+        """
+        if self.method != "send_message" or other.method != "send_message" or self.bot is not other.bot:
+            return False
+        if self.kwargs.get("reply_markup") is not None or other.kwargs.get("reply_markup") is not None:
+            return False
+        mine = {k: v for k, v in self.kwargs.items() if k != "text"}
+        theirs = {k: v for k, v in other.kwargs.items() if k != "text"}
+        combined = len(self.kwargs["text"]) + len(MERGE_SEPARATOR) + len(other.kwargs["text"])
+        return mine == theirs and combined <= MAX_MESSAGE_LENGTH
+
+    def merge(self, other: "_Outgoing"):
+        self.kwargs = dict(self.kwargs, text=self.kwargs["text"] + MERGE_SEPARATOR + other.kwargs["text"])
+        self.futures += other.futures
+        self.queued_at += other.queued_at
+        self.parents += other.parents
+
+
+class Outbox:
+    def __init__(self, coalesce_seconds: float, max_attempts: int, max_backoff: float, concurrency: int):
+        self.coalesce_seconds = coalesce_seconds
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chats = {}
+        self._drains = {}
+        self._depth = 0
+        self._resume_at = 0.0
+
+    def __len__(self) -> int:
+        return self._depth
+
+    def send_message(self, bot, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """Queue bot.send_message(chat_id, text, **kwargs). Returns a future for the sent Message."""
+        return self.submit(bot, chat_id, "send_message", text=text, **kwargs)
+
+    def submit(self, bot, chat_id: int, method: str, **kwargs) -> asyncio.Future:
+        """Queue any chat-scoped Bot API call, e.g. "send_document" or "edit_message_text"."""
+        item = _Outgoing(bot, method, kwargs)
+        self._chats.setdefault(chat_id, deque()).append(item)
+        self._depth += 1
+        OUTBOX_QUEUE_DEPTH.set(self._depth)
+        if chat_id not in self._drains:
+            self._drains[chat_id] = asyncio.create_task(self._drain(chat_id), name=f"outbox-{chat_id}")
+        return item.futures[0]
+
+    async def join(self):
+        """Wait until everything queued so far has been sent (or has failed)."""
+        while self._drains:
+            await asyncio.gather(*self._drains.values(), return_exceptions=True)
+
+    async def _drain(self, chat_id: int):
+        queue = self._chats[chat_id]
+        try:
+            while queue:
+                # Give handlers a moment to queue follow-up messages so they go out as one
+                await asyncio.sleep(self.coalesce_seconds)
+                batch = []
+                while queue:
+                    item = queue.popleft()
+                    if batch and batch[-1].can_merge(item):
+                        batch[-1].merge(item)
+                        OUTBOX_COALESCED.inc()
+                    else:
+                        batch.append(item)
+                for item in batch:
+                    await self._deliver(chat_id, item)
+        finally:
+            del self._chats[chat_id]
+            del self._drains[chat_id]
+
+    async def _deliver(self, chat_id: int, item: _Outgoing):
+        attributes = {"telegram.chat_id": chat_id, "outbox.method": item.method, "outbox.merged": len(item.futures)}
+        with ExitStack() as stack:
+            # A merged message is one send, recorded in the trace of every message it carries
+            spans = [
+                stack.enter_context(resume(parent, "reply", **attributes))
+                for parent in item.parents if parent is not None
+            ]
+            try:
+                if item.method == "send_message":
+                    parts = split_text(item.kwargs["text"])
+                    for s in spans:
+                        s.set_attribute("outbox.parts", len(parts))
+                    kwargs = {k: v for k, v in item.kwargs.items() if k not in ("text", "reply_markup")}
+                    for part in parts[:-1]:
+                        await self._call(item.bot, item.method, chat_id, dict(kwargs, text=part))
+                    result = await self._call(item.bot, item.method, chat_id, dict(item.kwargs, text=parts[-1]))
+                else:
+                    result = await self._call(item.bot, item.method, chat_id, item.kwargs)
+            except Exception as e:
+                OUTBOX_FAILURES.inc(method=item.method)
+                logger.warning("Outbound message failed", extra={"chat_id": chat_id, "method": item.method, "error": str(e)})
+                for s in spans:
+                    s.record_exception(e)
+                for future in item.futures:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for future in item.futures:
+                    if not future.done():
+                        future.set_result(result)
+            finally:
+                now = time.monotonic()
+                for queued_at in item.queued_at:
+                    OUTBOX_DELIVERY_SECONDS.observe(now - queued_at)
+                self._depth -= len(item.futures)
+                OUTBOX_QUEUE_DEPTH.set(self._depth)
+
+    async def _call(self, bot, method: str, chat_id: int, kwargs: dict):
+        """One Bot API call, retried on flood control and transient network errors."""
+        for attempt in range(1, self.max_attempts + 1):
+            pause = self._resume_at - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            document = kwargs.get("document")
+            if hasattr(document, "seek"):
+                document.seek(0)  # a failed attempt may have read part of the file
+            try:
+                async with self._slots:
+                    with OUTBOX_SEND_SECONDS.time(method=method):
+                        return await getattr(bot, method)(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_attempts:
+                    raise
+                OUTBOX_RETRIES.inc(reason="retry_after")
+                # Flood control applies to the whole bot, so every chat waits
+                self._resume_at = max(self._resume_at, time.monotonic() + _seconds(e.retry_after))
+            except BadRequest:
+                raise  # a NetworkError subclass, but retrying won't fix the request
+            except NetworkError:  # includes TimedOut
+                if attempt == self.max_attempts:
+                    raise
+                OUTBOX_RETRIES.inc(reason="network")
+                backoff = min(self.max_backoff, BASE_BACKOFF_SECONDS * 2 ** (attempt - 1))
+                await asyncio.sleep(backoff * random.uniform(0.5, 1))
+
+
+def _seconds(retry_after) -> float:
+    # int seconds in python-telegram-bot 21, a timedelta in later releases
+    return retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+
+
+outbox = Outbox(OUTBOX_COALESCE_MS / 1000, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_BACKOFF_SECONDS, OUTBOX_CONCURRENCY)
@@ -0,0 +1,146 @@
+"""Deadlines, hedged requests and circuit breaking for calls to external providers.
+
+ResilientCall wraps a blocking SDK call (run in a worker thread):
+
+- every call has a deadline; past it the caller gets TimeoutError
+- once enough latencies are recorded, a call still running at the
+  hedge_percentile of recent latencies gets a second, identical request and
+  the first successful response wins
+- consecutive failures open a CircuitBreaker; while open, calls fail
+  immediately with CircuitOpenError so callers can use a local fallback
+  instead of waiting on a provider brownout
+"""
+import asyncio
+import time
+from collections import deque
+
+from metrics import PROVIDER_CALL_SECONDS, PROVIDER_FAILURES, PROVIDER_HEDGES, PROVIDER_CIRCUIT_STATE
+
+CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+
+class CircuitOpenError(Exception):
+    """The provider's circuit breaker is open; the call was not attempted."""
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        """The pct-th percentile of recent durations, or None until min_samples are recorded."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds lets one probe call through."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._set_state(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self):
+        """The allowed call was abandoned without an outcome; let another probe through."""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def _set_state(self, state: int):
+        self.state = state
+        PROVIDER_CIRCUIT_STATE.set(state, call=self.name)
+
+
+class ResilientCall:
+    """One named provider call (e.g. "whisper") with its own deadline, latency history and breaker."""
+
+    def __init__(self, name: str, deadline: float, hedge_percentile: float | None,
+                 failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+        self.latency = LatencyTracker()
+
+    async def __call__(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a thread under the deadline, hedge and breaker."""
+        if not self.breaker.allow():
+            PROVIDER_FAILURES.inc(call=self.name, reason="circuit_open")
+            raise CircuitOpenError(f"{self.name} is temporarily unavailable")
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._hedged(fn, args, kwargs), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            PROVIDER_FAILURES.inc(call=self.name, reason="timeout")
+            self.breaker.record_failure()
+            raise TimeoutError(f"{self.name} did not respond within {self.deadline:g}s")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            PROVIDER_FAILURES.inc(call=self.name, reason="error")
+            self.breaker.record_failure()
+            raise
+
+        elapsed = time.perf_counter() - start
+        PROVIDER_CALL_SECONDS.observe(elapsed, call=self.name)
+        self.latency.add(elapsed)
+        self.breaker.record_success()
+        return result
+
+    async def _hedged(self, fn, args, kwargs):
+        tasks = {asyncio.create_task(asyncio.to_thread(fn, *args, **kwargs))}
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        error = None
+        try:
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    PROVIDER_HEDGES.inc(call=self.name)
+                    tasks.add(asyncio.create_task(asyncio.to_thread(fn, *args, **kwargs)))
+            # First success wins; only fail once every attempt has failed
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing (or abandoned) threads finish on their own, bounded by the SDK timeout
+            for task in tasks:
+                task.cancel()
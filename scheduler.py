@@ -1,18 +1,43 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
 from datetime import date, timedelta
-import pytz
+import asyncio
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
 from config import (
     TIMEZONE,
     MORNING_DIGEST_HOUR, MORNING_DIGEST_MINUTE,
     EVENING_DIGEST_HOUR, EVENING_DIGEST_MINUTE,
-    SUNDAY_PREVIEW_HOUR, SUNDAY_PREVIEW_MINUTE
+    SUNDAY_PREVIEW_HOUR, SUNDAY_PREVIEW_MINUTE,
+    ARCHIVE_HOUR, ARCHIVE_MINUTE, ARCHIVE_BATCH_SIZE, ARCHIVE_AFTER_DAYS
 )
-from database import get_active_users, get_all_users, get_leads_due_today, get_overdue_leads, get_leads_due_this_week, get_user
+from metrics import instrument, JOB_DURATION_SECONDS, JOB_USERS, JOB_MESSAGES_SENT, JOB_FAILURES
+from tracing import traced
+from outbox import outbox
+from database import (
+    get_active_users, get_all_users, get_leads_due_today, get_overdue_leads, get_leads_due_this_week,
+    archive_closed_leads
+)
+
+logger = logging.getLogger(__name__)
+
+# Created by setup_scheduler; apscheduler is only imported once the bot actually starts
+scheduler = None
+
 
-tz = pytz.timezone(TIMEZONE)
-scheduler = AsyncIOScheduler(timezone=tz)
+def _timed_job(fn):
+    """Run time into bot_job_duration_seconds{job=<function name>}, traced as a job.<name> root span."""
+    return traced(f"job.{fn.__name__}")(instrument(JOB_DURATION_SECONDS, label="job")(fn))
+
+
+async def _count_deliveries(job: str, sends: list):
+    """Wait for a job's queued messages, counting each into sent or failed."""
+    for user, send in sends:
+        try:
+            await send
+            JOB_MESSAGES_SENT.inc(job=job)
+        except Exception as e:
+            JOB_FAILURES.inc(job=job)
+            logger.warning("Failed to send scheduled message", extra={"job": job, "user_id": user["id"], "error": str(e)})
 
 
 def format_lead_list(leads: list) -> str:
@@ -24,10 +49,33 @@ def format_lead_list(leads: list) -> str:
     return "\n".join(lines)
 
 
+# Telegram renders very large keyboards poorly, so only the first few leads get buttons
+MAX_LEAD_BUTTONS = 20
+
+
+def lead_actions_keyboard(leads: list) -> InlineKeyboardMarkup | None:
+    """One row of Won / Lost / Snooze buttons per lead, handled by lead_action_callback in bot.py."""
+    if not leads:
+        return None
+    rows = []
+    for lead in leads[:MAX_LEAD_BUTTONS]:
+        lead_id = lead["id"]
+        rows.append([
+            InlineKeyboardButton(f"✅ {lead['name'][:16]}", callback_data=f"lead:won:{lead_id}"),
+            InlineKeyboardButton("❌ Lost", callback_data=f"lead:lost:{lead_id}"),
+            InlineKeyboardButton("💤 1d", callback_data=f"lead:snooze1d:{lead_id}"),
+            InlineKeyboardButton("💤 1w", callback_data=f"lead:snooze1w:{lead_id}"),
+        ])
+    return InlineKeyboardMarkup(rows)
+
+
+@_timed_job
 async def send_morning_digest(bot):
     """Send morning digest to all active users (Mon-Fri)."""
     users = get_active_users()
+    JOB_USERS.inc(len(users), job="send_morning_digest")
     
+    sends = []
     for user in users:
         today_leads = get_leads_due_today(user["id"])
         overdue_leads = get_overdue_leads(user["id"])
@@ -43,16 +91,21 @@ async def send_morning_digest(bot):
             if today_leads:
                 msg += f"📋 TODAY ({len(today_leads)}):\n{format_lead_list(today_leads)}"
         
-        try:
-            await bot.send_message(chat_id=user["telegram_id"], text=msg)
-        except Exception as e:
-            print(f"Failed to send morning digest to {user['name']}: {e}")
+        sends.append((user, outbox.send_message(
+            bot, user["telegram_id"], msg,
+            reply_markup=lead_actions_keyboard(overdue_leads + today_leads)
+        )))
+    
+    await _count_deliveries("send_morning_digest", sends)
 
 
+@_timed_job
 async def send_evening_digest(bot):
     """Send evening check-in to users with pending items (Mon-Fri)."""
     users = get_active_users()
+    JOB_USERS.inc(len(users), job="send_evening_digest")
     
+    sends = []
     for user in users:
         today_leads = get_leads_due_today(user["id"])
         overdue_leads = get_overdue_leads(user["id"])
@@ -62,17 +115,21 @@ async def send_evening_digest(bot):
         if pending:
             msg = f"EOD check-in, {user['name']}!\n\n"
             msg += f"📌 Still pending ({len(pending)}):\n{format_lead_list(pending)}\n\n"
-            msg += "Update with: 'Done with [name]' or 'Update [name] - [new status]'"
+            msg += "Tap a button below, or reply with 'Done with [name]' or 'Update [name] - [new status]'"
             
-            try:
-                await bot.send_message(chat_id=user["telegram_id"], text=msg)
-            except Exception as e:
-                print(f"Failed to send evening digest to {user['name']}: {e}")
+            sends.append((user, outbox.send_message(
+                bot, user["telegram_id"], msg,
+                reply_markup=lead_actions_keyboard(pending)
+            )))
+    
+    await _count_deliveries("send_evening_digest", sends)
 
 
+@_timed_job
 async def send_sunday_preview(bot):
     """Send week-ahead preview on Sunday evening."""
     users = get_all_users()  # Include OOO users for planning
+    JOB_USERS.inc(len(users), job="send_sunday_preview")
     
     # Calculate Monday to Friday of upcoming week (Sunday -> next day is Monday)
     today = date.today()
@@ -82,6 +139,7 @@ async def send_sunday_preview(bot):
     monday = today + timedelta(days=days_until_monday)
     friday = monday + timedelta(days=4)
     
+    sends = []
     for user in users:
         week_leads = get_leads_due_this_week(user["id"], monday, friday)
         overdue = get_overdue_leads(user["id"])
@@ -99,14 +157,37 @@ async def send_sunday_preview(bot):
         else:
             msg += "No follow-ups scheduled for this week."
         
-        try:
-            await bot.send_message(chat_id=user["telegram_id"], text=msg)
-        except Exception as e:
-            print(f"Failed to send Sunday preview to {user['name']}: {e}")
+        sends.append((user, outbox.send_message(bot, user["telegram_id"], msg)))
+    
+    await _count_deliveries("send_sunday_preview", sends)
+
+
+# Upper bound on batches per nightly run, so a large backlog drains over several nights
+MAX_ARCHIVE_BATCHES = 200
+
+
+@_timed_job
+async def archive_leads():
+    """Move leads closed more than ARCHIVE_AFTER_DAYS ago into leads_archive, one batch at a time."""
+    moved = 0
+    for _ in range(MAX_ARCHIVE_BATCHES):
+        batch = archive_closed_leads(ARCHIVE_BATCH_SIZE, ARCHIVE_AFTER_DAYS)
+        moved += batch
+        if batch < ARCHIVE_BATCH_SIZE:
+            break
+        await asyncio.sleep(0)  # let queued updates run between batches
+    logger.info("Archived closed leads", extra={"archived": moved})
+    return moved
 
 
 def setup_scheduler(bot):
     """Set up all scheduled jobs."""
+    global scheduler
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    import pytz
+    
+    scheduler = AsyncIOScheduler(timezone=pytz.timezone(TIMEZONE))
     
     # Morning digest: Mon-Fri at 8:30 AM
     scheduler.add_job(
@@ -132,5 +213,12 @@ def setup_scheduler(bot):
         id="sunday_preview"
     )
     
+    # Archive closed leads: nightly at 2:00 AM
+    scheduler.add_job(
+        archive_leads,
+        CronTrigger(hour=ARCHIVE_HOUR, minute=ARCHIVE_MINUTE),
+        id="archive_leads"
+    )
+    
     scheduler.start()
-    print("Scheduler started with morning/evening digests and Sunday preview")
+    logger.info("Scheduler started with morning/evening digests, Sunday preview and nightly archival")
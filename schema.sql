@@ -17,9 +17,197 @@ CREATE TABLE leads (
     status TEXT DEFAULT 'active' CHECK (status IN ('active', 'won', 'lost')),
     follow_up_date DATE,
     created_at TIMESTAMPTZ DEFAULT NOW(),
-    updated_at TIMESTAMPTZ DEFAULT NOW()
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    closed_at TIMESTAMPTZ,
+    -- Full-text search over name, company and next steps (names/companies rank above notes)
+    search TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '') || ' ' || coalesce(company, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(next_steps, '')), 'B')
+    ) STORED
+);
+
+-- Closed leads are moved here by archive_closed_leads(), so leads (and its indexes)
+-- stays proportional to active leads. Same columns, plus when the row was archived.
+CREATE TABLE leads_archive (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    company TEXT NOT NULL,
+    next_steps TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('won', 'lost')),
+    follow_up_date DATE,
+    created_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ,
+    closed_at TIMESTAMPTZ,
+    archived_at TIMESTAMPTZ DEFAULT NOW(),
+    search TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '') || ' ' || coalesce(company, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(next_steps, '')), 'B')
+    ) STORED
 );
 
 CREATE INDEX idx_leads_user_id ON leads(user_id);
-CREATE INDEX idx_leads_follow_up_date ON leads(follow_up_date);
+-- Digests, /today and /leads only ever look at active leads
+CREATE INDEX idx_leads_active_follow_up ON leads(user_id, follow_up_date) WHERE status = 'active';
 CREATE INDEX idx_users_telegram_id ON users(telegram_id);
+CREATE INDEX idx_leads_search ON leads USING GIN(search);
+CREATE INDEX idx_leads_archive_user_status ON leads_archive(user_id, status);
+CREATE INDEX idx_leads_archive_search ON leads_archive USING GIN(search);
+
+-- Running per-rep totals behind /stats, kept current by triggers on leads and leads_archive
+-- so pipeline_stats never scans either table. Archiving a lead deletes it from one table and
+-- inserts it into the other, which nets to zero. No foreign key: rows for deleted users just
+-- drop to zero when their leads cascade away.
+CREATE TABLE pipeline_counts (
+    user_id INTEGER PRIMARY KEY,
+    active BIGINT NOT NULL DEFAULT 0,
+    won BIGINT NOT NULL DEFAULT 0,
+    lost BIGINT NOT NULL DEFAULT 0,
+    closed_days_sum NUMERIC NOT NULL DEFAULT 0,
+    closed_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- Add (p_sign = 1) or remove (p_sign = -1) one lead's contribution to its rep's totals
+CREATE OR REPLACE FUNCTION pipeline_counts_add(p_user_id INTEGER, p_status TEXT, p_days NUMERIC, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE sql AS $$
+    INSERT INTO pipeline_counts AS c (user_id, active, won, lost, closed_days_sum, closed_count)
+    SELECT p_user_id,
+           CASE WHEN p_status = 'active' THEN p_sign ELSE 0 END,
+           CASE WHEN p_status = 'won' THEN p_sign ELSE 0 END,
+           CASE WHEN p_status = 'lost' THEN p_sign ELSE 0 END,
+           CASE WHEN p_status <> 'active' THEN p_sign * COALESCE(p_days, 0) ELSE 0 END,
+           CASE WHEN p_status <> 'active' THEN p_sign ELSE 0 END
+    WHERE p_user_id IS NOT NULL
+    ON CONFLICT (user_id) DO UPDATE SET
+        active = c.active + EXCLUDED.active,
+        won = c.won + EXCLUDED.won,
+        lost = c.lost + EXCLUDED.lost,
+        closed_days_sum = c.closed_days_sum + EXCLUDED.closed_days_sum,
+        closed_count = c.closed_count + EXCLUDED.closed_count;
+$$;
+
+CREATE OR REPLACE FUNCTION pipeline_counts_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pipeline_counts_add(OLD.user_id, OLD.status,
+            EXTRACT(EPOCH FROM (COALESCE(OLD.closed_at, OLD.updated_at) - OLD.created_at))::NUMERIC / 86400, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pipeline_counts_add(NEW.user_id, NEW.status,
+            EXTRACT(EPOCH FROM (COALESCE(NEW.closed_at, NEW.updated_at) - NEW.created_at))::NUMERIC / 86400, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER leads_pipeline_counts
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, status, created_at, updated_at, closed_at ON leads
+    FOR EACH ROW EXECUTE FUNCTION pipeline_counts_trigger();
+CREATE TRIGGER leads_archive_pipeline_counts
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, status, created_at, updated_at, closed_at ON leads_archive
+    FOR EACH ROW EXECUTE FUNCTION pipeline_counts_trigger();
+
+-- Pipeline stats for /stats: totals from pipeline_counts; only "overdue" depends on the date, and
+-- it is counted from the partial idx_leads_active_follow_up index.
+-- p_user_id NULL returns one row per rep. p_today is passed in so "overdue" matches the bot's date.
+CREATE OR REPLACE FUNCTION pipeline_stats(p_user_id INTEGER DEFAULT NULL, p_today DATE DEFAULT CURRENT_DATE)
+RETURNS TABLE (
+    user_id INTEGER,
+    active BIGINT,
+    won BIGINT,
+    lost BIGINT,
+    overdue BIGINT,
+    avg_days_to_close NUMERIC
+)
+LANGUAGE sql STABLE AS $$
+    SELECT
+        c.user_id,
+        c.active,
+        c.won,
+        c.lost,
+        (SELECT COUNT(*) FROM leads l
+         WHERE l.user_id = c.user_id AND l.status = 'active' AND l.follow_up_date < p_today),
+        ROUND(c.closed_days_sum / NULLIF(c.closed_count, 0), 1)
+    FROM pipeline_counts c
+    WHERE (p_user_id IS NULL OR c.user_id = p_user_id)
+      AND c.active + c.won + c.lost > 0;
+$$;
+
+-- Ranked full-text search for /search and the voice search intent, over live and archived leads.
+-- p_query uses web-search syntax: plain words, "quoted phrases", -excluded, or.
+CREATE OR REPLACE FUNCTION search_leads(p_user_id INTEGER, p_query TEXT, p_limit INTEGER DEFAULT 5, p_offset INTEGER DEFAULT 0)
+RETURNS TABLE (
+    id INTEGER,
+    name TEXT,
+    company TEXT,
+    next_steps TEXT,
+    status TEXT,
+    follow_up_date DATE,
+    rank REAL
+)
+LANGUAGE sql STABLE AS $$
+    SELECT l.id, l.name, l.company, l.next_steps, l.status, l.follow_up_date, ts_rank(l.search, q) AS rank
+    FROM (
+        SELECT id, user_id, name, company, next_steps, status, follow_up_date, search FROM leads
+        UNION ALL
+        SELECT id, user_id, name, company, next_steps, status, follow_up_date, search FROM leads_archive
+    ) l, websearch_to_tsquery('english', p_query) q
+    WHERE l.user_id = p_user_id AND l.search @@ q
+    ORDER BY rank DESC, l.id DESC
+    LIMIT p_limit OFFSET p_offset;
+$$;
+
+-- Move up to p_batch_size leads closed more than p_min_age_days ago into leads_archive.
+-- Returns how many rows moved; the scheduler calls it repeatedly until that is < p_batch_size.
+CREATE OR REPLACE FUNCTION archive_closed_leads(p_batch_size INTEGER DEFAULT 500, p_min_age_days INTEGER DEFAULT 7)
+RETURNS INTEGER
+LANGUAGE sql AS $$
+    WITH moved AS (
+        DELETE FROM leads
+        WHERE id IN (
+            SELECT id FROM leads
+            WHERE status <> 'active'
+              AND COALESCE(closed_at, updated_at) < NOW() - make_interval(days => p_min_age_days)
+            ORDER BY id
+            LIMIT p_batch_size
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, user_id, name, company, next_steps, status, follow_up_date, created_at, updated_at, closed_at
+    ), archived AS (
+        INSERT INTO leads_archive (id, user_id, name, company, next_steps, status, follow_up_date, created_at, updated_at, closed_at)
+        SELECT * FROM moved
+        RETURNING id
+    )
+    SELECT COUNT(*)::INTEGER FROM archived;
+$$;
+
+-- Upgrading an existing database: run the statements above that don't exist yet, plus
+-- ALTER TABLE leads ADD COLUMN IF NOT EXISTS closed_at TIMESTAMPTZ;
+-- ALTER TABLE leads ADD COLUMN IF NOT EXISTS search TSVECTOR GENERATED ALWAYS AS (
+--     setweight(to_tsvector('english', coalesce(name, '') || ' ' || coalesce(company, '')), 'A') ||
+--     setweight(to_tsvector('english', coalesce(next_steps, '')), 'B')
+-- ) STORED;
+-- DROP INDEX IF EXISTS idx_leads_follow_up_date;
+-- DROP INDEX IF EXISTS idx_leads_user_status;
+--
+-- Backfilling pipeline_counts: in one transaction, so no write is counted twice or missed,
+-- BEGIN;
+-- LOCK TABLE leads, leads_archive IN SHARE MODE;
+-- (create pipeline_counts, its functions and both triggers from above)
+-- INSERT INTO pipeline_counts (user_id, active, won, lost, closed_days_sum, closed_count)
+-- SELECT user_id,
+--        COUNT(*) FILTER (WHERE status = 'active'),
+--        COUNT(*) FILTER (WHERE status = 'won'),
+--        COUNT(*) FILTER (WHERE status = 'lost'),
+--        COALESCE(SUM(EXTRACT(EPOCH FROM (COALESCE(closed_at, updated_at) - created_at))::NUMERIC / 86400)
+--                 FILTER (WHERE status <> 'active'), 0),
+--        COUNT(*) FILTER (WHERE status <> 'active')
+-- FROM (SELECT user_id, status, created_at, updated_at, closed_at FROM leads
+--       UNION ALL
+--       SELECT user_id, status, created_at, updated_at, closed_at FROM leads_archive) l
+-- WHERE user_id IS NOT NULL
+-- GROUP BY user_id;
+-- COMMIT;
@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_bench(**env):
+    base = {k: v for k, v in os.environ.items() if not k.startswith(("SUPABASE_", "GROQ_", "TELEGRAM_"))}
+    return subprocess.run(
+        [sys.executable, "-m", "bench.run", "--updates", "40", "--digest-users", "5", "--whisper-latency", "0"],
+        cwd=ROOT, env={**base, **env}, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_bench_runs_without_credentials():
+    result = run_bench()
+    assert result.returncode == 0, result.stderr
+    assert "0 errors" in result.stdout
+
+
+def test_bench_ignores_placeholder_credentials():
+    # The fakes replace every client, so a key the real SDK would reject must never reach it
+    result = run_bench(SUPABASE_URL="http://localhost.invalid", SUPABASE_KEY="bench", GROQ_API_KEY="bench")
+    assert result.returncode == 0, result.stderr
+    assert "0 errors" in result.stdout
@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import voice
+from voice import parse_intent_locally
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Show my leads", {"action": "list_leads"}),
+    ("find acme pricing", {"action": "search_leads", "query": "acme pricing"}),
+    ("Add lead John at Acme, send proposal",
+     {"action": "add_lead", "name": "John", "company": "Acme", "next_steps": "send proposal", "follow_up_date": None}),
+    ("Done with John", {"action": "done_lead", "name": "John", "status": "won"}),
+    ("Lost Acme", {"action": "done_lead", "name": "Acme", "status": "lost"}),
+    ("Update John - sent deck",
+     {"action": "update_lead", "name": "John", "next_steps": "sent deck", "follow_up_date": None}),
+])
+def test_explicit_commands(text, expected):
+    assert parse_intent_locally(text) == expected
+
+
+def test_update_is_not_read_as_add_or_done():
+    assert parse_intent_locally("Update John - send the address at the office") == {
+        "action": "update_lead", "name": "John", "next_steps": "send the address at the office", "follow_up_date": None,
+    }
+    assert parse_intent_locally("Update Acme - lost contact with them, retry Monday")["action"] == "update_lead"
+    assert parse_intent_locally("Update John - proposal complete pending signoff")["action"] == "update_lead"
+
+
+@pytest.mark.parametrize("text", [
+    "Met John from Acme, send proposal",
+    "Please send the address to John",
+    "We lost contact with Acme",
+    "Proposal complete for John",
+    "Update John",
+    "hello",
+])
+def test_anything_else_is_unknown(text):
+    assert parse_intent_locally(text) == {"action": "unknown"}
+
+
+@pytest.mark.parametrize("answer", ["Sure! Here is the JSON you asked for", "```json\n[1, 2]\n```", ""])
+def test_malformed_llm_answer_falls_back_to_local_parser(monkeypatch, answer):
+    async def llm_call(create, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+    monkeypatch.setattr(voice, "llm_call", llm_call)
+    monkeypatch.setattr(voice, "get_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=None))))
+    before = voice.INTENT_FALLBACKS.value()
+    intent = asyncio.run(voice.parse_intent_with_llm("Done with John", "2026-01-05 (Monday)"))
+    assert intent == {"action": "done_lead", "name": "John", "status": "won"}
+    assert voice.INTENT_FALLBACKS.value() == before + 1
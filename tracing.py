@@ -0,0 +1,252 @@
+"""Request-scoped tracing exported as OTLP/JSON lines to a rotating local file.
+
+Every Telegram update (and scheduler job) opens a root span; nested span()
+calls become its children via a contextvar, so they follow the update across
+awaits and asyncio.to_thread. Work handed to another task (the voice queue,
+the outbox) keeps its place with capture() and resume(). A trace is buffered
+until its root span and every captured continuation have ended, then handed to a background thread that writes it as one
+ExportTraceServiceRequest per line. Sampling is decided at that point:
+errored and slow traces are always kept, the rest at TRACE_SAMPLE_RATE.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager
+
+from config import TRACE_FILE, TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_MAX_BYTES, TRACE_BACKUP_COUNT
+
+SERVICE_NAME = "asiapac-sales-bot"
+
+# Long scheduler jobs touch every user; stop recording children past this many
+MAX_SPANS_PER_TRACE = 2000
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_export_queue = queue.Queue(maxsize=1000)
+_listener = None
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_span_id", "name", "attributes",
+                 "start_ns", "end_ns", "status", "events")
+
+    def __init__(self, name: str, trace: "_Trace", parent_span_id: str = "", attributes: dict | None = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_OK
+        self.events = []
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.status = STATUS_ERROR
+        self.trace.errored = True
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": "exception",
+            "attributes": _otlp_attributes({"exception.type": type(exc).__name__, "exception.message": str(exc)}),
+        })
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.events:
+            span["events"] = self.events
+        return span
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans", "dropped", "errored", "root", "pending")
+
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.dropped = 0
+        self.errored = False
+        self.root = None  # set once the root span has ended
+        self.pending = 0  # captured continuations not yet resumed and ended
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Open a child of the current span, or a new root span (and trace) if there is none."""
+    parent = _current_span.get()
+    if parent is None:
+        trace, parent_span_id = _Trace(), ""
+    else:
+        trace, parent_span_id = parent.trace, parent.span_id
+
+    current = Span(name, trace, parent_span_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.record_exception(exc)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if len(trace.spans) < MAX_SPANS_PER_TRACE:
+            trace.spans.append(current)
+        else:
+            trace.dropped += 1
+        if parent is None:
+            trace.root = current
+            if not trace.pending:
+                _finish_trace(trace, current)
+
+
+def capture() -> Span | None:
+    """The current span, held open for work that will continue in another task.
+
+    The trace isn't exported until each capture() is matched by a resume().
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        parent.trace.pending += 1
+    return parent
+
+
+@contextmanager
+def resume(parent: Span | None, name: str, **attributes):
+    """Open span `name` as a child of a captured span (or as a new root span if parent is None)."""
+    token = _current_span.set(parent)
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    finally:
+        _current_span.reset(token)
+        if parent is not None:
+            trace = parent.trace
+            trace.pending -= 1
+            if not trace.pending and trace.root is not None:
+                _finish_trace(trace, trace.root)
+
+
+def traced(name: str | None = None):
+    """Decorator wrapping a sync or async function in a span named after it."""
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_update(fn):
+    """Decorator for Telegram handlers: one root span per update, tagged with the update and user ids."""
+    @functools.wraps(fn)
+    async def wrapper(update, context):
+        user = getattr(update, "effective_user", None)
+        attributes = {
+            "telegram.update_id": getattr(update, "update_id", None),
+            "telegram.user_id": getattr(user, "id", None),
+        }
+        with span(f"update {fn.__name__}", **attributes):
+            return await fn(update, context)
+    return wrapper
+
+
+def _finish_trace(trace: _Trace, root: Span):
+    # Continuations can outlive the root span; the trace lasts until the last span ends
+    duration_ms = (max((s.end_ns for s in trace.spans), default=root.end_ns) - root.start_ns) / 1e6
+    keep = trace.errored or (TRACE_SLOW_MS and duration_ms >= TRACE_SLOW_MS) or random.random() < TRACE_SAMPLE_RATE
+    if not keep or _listener is None:
+        return
+    if trace.dropped:
+        root.set_attribute("trace.dropped_spans", trace.dropped)
+    try:
+        # Serialization happens on the listener thread; the handler only enqueues
+        _export_queue.put_nowait(logging.makeLogRecord({"msg": trace.spans}))
+    except queue.Full:
+        pass
+
+
+class _OtlpFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+            "scopeSpans": [{
+                "scope": {"name": "bot"},
+                "spans": [s.to_otlp() for s in record.msg],
+            }],
+        }]})
+
+
+def setup_tracing():
+    """Start the background exporter; until this runs, finished traces are discarded."""
+    global _listener
+    if _listener is not None or not (TRACE_SAMPLE_RATE or TRACE_SLOW_MS):
+        return
+    file_handler = logging.handlers.RotatingFileHandler(
+        TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(_OtlpFormatter())
+    _listener = logging.handlers.QueueListener(_export_queue, file_handler)
+    _listener.start()
+
+
+def shutdown_tracing():
+    """Flush queued traces to disk."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
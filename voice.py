@@ -1,38 +1,74 @@
 import httpx
-import tempfile
-import os
 import json
-from groq import Groq
-from config import GROQ_API_KEY
+import logging
+from contextlib import contextmanager
+from config import (
+    GROQ_API_KEY, GROQ_WHISPER_DEADLINE, GROQ_LLM_DEADLINE, GROQ_HEDGE_PERCENTILE,
+    GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET_SECONDS
+)
+from metrics import VOICE_STAGE_SECONDS, INTENT_FALLBACKS
+from resilience import ResilientCall, CircuitOpenError
+from tracing import span, traced
 
-client = Groq(api_key=GROQ_API_KEY)
+logger = logging.getLogger(__name__)
 
+_client = None
 
+
+def get_client():
+    """The shared Groq client for Whisper and the intent LLM, with the SDK's own retries off."""
+    global _client
+    if _client is None:
+        from groq import Groq
+        # Retries are replaced by hedging, and the SDK timeout bounds threads abandoned at a deadline
+        _client = Groq(api_key=GROQ_API_KEY, max_retries=0, timeout=max(GROQ_WHISPER_DEADLINE, GROQ_LLM_DEADLINE))
+    return _client
+
+
+whisper_call = ResilientCall(
+    "whisper", GROQ_WHISPER_DEADLINE, GROQ_HEDGE_PERCENTILE, GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET_SECONDS
+)
+llm_call = ResilientCall(
+    "llm", GROQ_LLM_DEADLINE, GROQ_HEDGE_PERCENTILE, GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET_SECONDS
+)
+
+
+@contextmanager
+def voice_stage(name: str):
+    """A voice pipeline stage: traced as a span and timed into bot_voice_stage_seconds{stage=name}."""
+    with span(name), VOICE_STAGE_SECONDS.time(stage=name):
+        yield
+
+
+@traced()
 async def transcribe_voice(file_url: str, bot_token: str) -> str:
     """Download voice file from Telegram and transcribe with Groq Whisper."""
-    async with httpx.AsyncClient() as http_client:
-        response = await http_client.get(file_url)
-        audio_data = response.content
-
-    # Write to temp file - Groq needs a proper file
-    with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tmp:
-        tmp.write(audio_data)
-        tmp_path = tmp.name
-    
-    try:
-        with open(tmp_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                file=audio_file,
+    with voice_stage("download"):
+        async with httpx.AsyncClient() as http_client:
+            response = await http_client.get(file_url)
+            audio_data = response.content
+
+    # Passed as (filename, bytes) so a hedged retry can resend the same audio
+    with voice_stage("whisper"):
+        try:
+            transcription = await whisper_call(
+                get_client().audio.transcriptions.create,
+                file=("voice.ogg", audio_data),
                 model="whisper-large-v3",
                 language="en"
             )
-        return transcription.text
-    finally:
-        os.unlink(tmp_path)
+        except CircuitOpenError:
+            raise CircuitOpenError("transcription is temporarily unavailable, please try again in a minute or use text commands")
+    return transcription.text
+
 
+async def parse_intent_with_llm(text: str, today_date: str) -> dict:
+    """Use Groq LLM to parse natural language into structured intent.
 
-def parse_intent_with_llm(text: str, today_date: str) -> dict | None:
-    """Use Groq LLM to parse natural language into structured intent."""
+    If the LLM is down, slow past its deadline, its circuit is open, or it
+    answers with something that isn't a JSON object, falls back to the local
+    text parsers so simple commands keep working.
+    """
     prompt = f"""Parse this sales note into a JSON action. Return ONLY valid JSON, no other text.
 
 Today's date: {today_date} (use this to calculate any relative dates)
@@ -44,7 +80,8 @@ Possible actions:
 2. update_lead: {{"action": "update_lead", "name": "person or company name", "next_steps": "new status/next steps", "follow_up_date": "YYYY-MM-DD or null"}}
 3. done_lead: {{"action": "done_lead", "name": "person or company name", "status": "won" or "lost"}}
 4. list_leads: {{"action": "list_leads"}}
-5. unknown: {{"action": "unknown"}}
+5. search_leads: {{"action": "search_leads", "query": "keywords to look for"}}
+6. unknown: {{"action": "unknown"}}
 
 Rules:
 - For add_lead: extract name (person), company, and what needs to be done
@@ -59,16 +96,24 @@ Rules:
   - "next month" = 1st of next month
 - If no date/time mentioned, set follow_up_date to null
 - The name field can be a person name OR company name - whatever helps identify the lead
+- Use search_leads when the user is looking for a lead by topic or keywords (e.g. "find the one about the pricing proposal"); put only the distinctive keywords in query
 
 JSON response:"""
 
     try:
-        response = client.chat.completions.create(
+        response = await llm_call(
+            get_client().chat.completions.create,
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
             max_tokens=200
         )
+    except Exception as e:
+        logger.warning("LLM unavailable, using local parser", extra={"error": str(e)})
+        INTENT_FALLBACKS.inc()
+        return parse_intent_locally(text)
+
+    try:
         result = response.choices[0].message.content.strip()
         # Clean up response - remove markdown if present
         if result.startswith("```"):
@@ -76,10 +121,54 @@ JSON response:"""
             if result.startswith("json"):
                 result = result[4:]
         result = result.strip()
-        return json.loads(result)
+        intent = json.loads(result)
+        if not isinstance(intent, dict):
+            raise ValueError(f"expected a JSON object, got {type(intent).__name__}")
+        return intent
     except Exception as e:
-        print(f"LLM parse error: {e}")
-        return None
+        logger.warning("LLM parse error, using local parser", extra={"error": str(e)})
+        INTENT_FALLBACKS.inc()
+        return parse_intent_locally(text)
+
+
+def parse_intent_locally(text: str) -> dict:
+    """Best-effort intent for when the LLM is unavailable, in the same shape the LLM returns.
+
+    Only commands that start with an explicit verb are recognised; anything
+    else is "unknown" rather than a guess that could write to the wrong lead.
+    """
+    text = text.strip()
+    text_lower = text.lower()
+
+    if text_lower.startswith(("show", "list")) and "lead" in text_lower:
+        return {"action": "list_leads"}
+    for prefix in ("find ", "search for ", "search "):
+        if text_lower.startswith(prefix):
+            return {"action": "search_leads", "query": text[len(prefix):].strip()}
+
+    # "Update John - sent deck" / "Update John: sent deck"
+    if text_lower.startswith("update "):
+        remainder = text[len("update "):]
+        for sep in (" - ", ": "):
+            name, found, next_steps = remainder.partition(sep)
+            if found and name.strip() and next_steps.strip():
+                return {"action": "update_lead", "name": name.strip().title(),
+                        "next_steps": next_steps.strip(), "follow_up_date": None}
+        return {"action": "unknown"}
+
+    if text_lower.startswith(("add lead", "new lead")):
+        lead = parse_lead_from_text(text)
+        if lead:
+            return {"action": "add_lead", **lead, "follow_up_date": None}
+        return {"action": "unknown"}
+
+    for prefix, status in (("done with ", "won"), ("won ", "won"), ("lost ", "lost")):
+        if text_lower.startswith(prefix):
+            name = text[len(prefix):].strip()
+            if name:
+                return {"action": "done_lead", "name": name.title(), "status": status}
+
+    return {"action": "unknown"}
 
 
 def parse_lead_from_text(text: str) -> dict | None: